@@ -0,0 +1,100 @@
+# Benchmarks page_parser over saved Talabat pages.
+#
+#   python benchmark_parsers.py [fixtures_dir] --repeat 5
+#
+# The fixture directory holds pages saved from the site (e.g. driver.page_source
+# or the HTTP response body): listing*.html for restaurant listing pages and
+# restaurant*.html for restaurant pages with reviews. It defaults to the small
+# sanitized pages in tests/fixtures; point it at full saved pages for numbers
+# that reflect the real site. Every backend is checked against the original
+# full-page html.parser output before it is timed.
+from page_parser import (
+    DEFAULT_BACKEND, NeedsBrowser, parse_embedded_reviews, parse_review_page, parse_total_number_of_pages,
+    parse_vendor_cards
+)
+import argparse
+import glob
+import os
+import time
+
+BACKENDS = ["html.parser", "lxml"] if DEFAULT_BACKEND == "lxml" else ["html.parser"]
+
+REFERENCE = ("html.parser", False)
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tests", "fixtures")
+
+
+def parse_listing(html, backend, targeted):
+    try:
+        total_number_of_pages = parse_total_number_of_pages(html, backend, targeted)
+    except (NeedsBrowser, IndexError, ValueError):
+        total_number_of_pages = None
+    try:
+        vendors = parse_vendor_cards(html, backend, targeted)
+    except NeedsBrowser:
+        vendors = []
+    return total_number_of_pages, vendors
+
+
+def parse_restaurant(html, backend, targeted):
+    return parse_review_page(html, backend, targeted), parse_embedded_reviews(html, backend, targeted)
+
+
+PAGE_KINDS = {
+    "listing": ("listing*.html", parse_listing),
+    "restaurant": ("restaurant*.html", parse_restaurant),
+}
+
+
+def load_fixtures(fixtures_dir, pattern):
+    pages = []
+    for path in sorted(glob.glob(os.path.join(fixtures_dir, pattern))):
+        with open(path, encoding="utf-8") as f:
+            pages.append((os.path.basename(path), f.read()))
+    return pages
+
+
+def benchmark(pages, parse, backend, targeted, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for _, html in pages:
+            parse(html, backend, targeted)
+    elapsed = time.perf_counter() - started
+    page_count = len(pages) * repeat
+    megabytes = sum(len(html.encode("utf-8")) for _, html in pages) * repeat / (1024 * 1024)
+    return page_count / elapsed, megabytes / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Talabat page parsers")
+    parser.add_argument(
+        "fixtures_dir", nargs="?", default=FIXTURES_DIR,
+        help="directory with listing*.html and restaurant*.html pages"
+    )
+    parser.add_argument("--repeat", type=int, default=5, help="times every page is parsed per variant")
+    args = parser.parse_args()
+
+    variants = [(backend, targeted) for backend in BACKENDS for targeted in (False, True)]
+    found_pages = False
+    for kind, (pattern, parse) in PAGE_KINDS.items():
+        pages = load_fixtures(args.fixtures_dir, pattern)
+        if not pages:
+            continue
+        found_pages = True
+        print(f"\n{kind}: {len(pages)} pages")
+
+        expected = {name: parse(html, *REFERENCE) for name, html in pages}
+        for backend, targeted in variants:
+            label = f"{backend}{' targeted' if targeted else ' full page'}"
+            mismatches = [name for name, html in pages if parse(html, backend, targeted) != expected[name]]
+            if mismatches:
+                print(f"  {label:<24} output differs on {', '.join(mismatches)}")
+                continue
+            pages_per_second, megabytes_per_second = benchmark(pages, parse, backend, targeted, args.repeat)
+            print(f"  {label:<24} {pages_per_second:8.1f} pages/s {megabytes_per_second:8.2f} MB/s")
+
+    if not found_pages:
+        print(f"No listing*.html or restaurant*.html fixtures in {args.fixtures_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+from selenium import webdriver
+from selenium.webdriver.chrome.service import Service
+from selenium.webdriver.chrome.options import Options
+import config
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# Keep every resource timing entry so transferred_bytes() covers the whole page,
+# not just the first 250 requests.
+RESOURCE_TIMING_JS = "performance.setResourceTimingBufferSize(100000);"
+
+TRANSFERRED_BYTES_JS = """
+let total = 0;
+for (const entry of performance.getEntriesByType('navigation')) total += entry.transferSize || 0;
+for (const entry of performance.getEntriesByType('resource')) total += entry.transferSize || 0;
+return total;
+"""
+
+
+def create_driver(lean=False):
+    service = Service(executable_path='/usr/bin/chromedriver')
+    chrome_options = Options()
+    chrome_options.binary_location = '/usr/bin/chromium-browser'
+    chrome_options.add_argument("--headless=new")
+    chrome_options.add_argument("--disable-gpu")
+    chrome_options.add_argument("--no-sandbox")
+    if lean:
+        # Return from driver.get() at DOMContentLoaded; the scraper waits for
+        # the review nodes it needs anyway.
+        chrome_options.page_load_strategy = "eager"
+        chrome_options.add_argument("--blink-settings=imagesEnabled=false")
+        chrome_options.add_argument("--disable-extensions")
+
+    driver = webdriver.Chrome(service=service, options=chrome_options)
+    driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {"source": RESOURCE_TIMING_JS})
+    if lean:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": config.LEAN_BLOCKED_URLS})
+    return driver
+
+
+def transferred_bytes(driver):
+    # Bytes the current page pulled over the network. Cross-origin responses
+    # without Timing-Allow-Origin report 0, so this is a lower bound.
+    return driver.execute_script(TRANSFERRED_BYTES_JS)
+
+
+def driver_memory_mb(driver):
+    # Resident memory of chromedriver and every browser process it started,
+    # or None when psutil is not installed.
+    if psutil is None:
+        return None
+    try:
+        process = psutil.Process(driver.service.process.pid)
+        processes = [process] + process.children(recursive=True)
+    except psutil.Error:
+        return None
+    total = 0
+    for child in processes:
+        try:
+            total += child.memory_info().rss
+        except psutil.Error:
+            pass
+    return total / (1024 * 1024)
@@ -0,0 +1,68 @@
+# Politeness and waiting limits shared by the crawlers
+
+# Token bucket per host: steady request rate, and how many requests may burst.
+# In a distributed crawl the bucket is shared by every node, so these limit the
+# whole crawl: raise MAX_REQUESTS_PER_SECOND (--max-requests-per-second) with
+# the number of nodes for throughput to grow with them.
+REQUESTS_PER_SECOND = 0.5
+MIN_REQUESTS_PER_SECOND = 0.1
+MAX_REQUESTS_PER_SECOND = 2.0
+REQUEST_BURST = 2
+
+# On an error the host's rate is multiplied by RATE_BACKOFF_FACTOR; every
+# healthy response adds RATE_SPEEDUP_STEP back, up to MAX_REQUESTS_PER_SECOND.
+RATE_BACKOFF_FACTOR = 0.5
+RATE_SPEEDUP_STEP = 0.02
+
+# --engine http: seconds before a request times out, and pooled connections
+# kept per host (one per worker is enough)
+HTTP_TIMEOUT = 15
+HTTP_POOL_SIZE = 4
+# Retries for connections that could not be opened, before any request reached
+# the site. Error responses (429, 5xx) are never retried by the HTTP client:
+# the rate limiter backs off on them and the page falls back to the browser.
+HTTP_CONNECT_RETRIES = 2
+HTTP_RETRY_BACKOFF = 0.5
+
+# Seconds to wait for the first reviews of a restaurant page to render
+REVIEWS_TIMEOUT = 10
+# Seconds to wait for the load-more button once the reviews are on the page
+LOAD_MORE_BUTTON_TIMEOUT = 2
+# Seconds to wait after a load-more click for new reviews or the button to go away
+LOAD_MORE_RESULT_TIMEOUT = 10
+
+# Local SQLite file recording crawl progress for --resume and early-stop re-scrapes
+CRAWL_STATE_PATH = "crawl_state.sqlite3"
+
+# --lean browser mode: request patterns blocked through the DevTools protocol
+LEAN_BLOCKED_URLS = [
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.svg", "*.ico",
+    "*.woff", "*.woff2", "*.ttf", "*.otf",
+    "*.css",
+    "*.mp4", "*.webm",
+    "*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*",
+    "*facebook.net*", "*facebook.com/tr*", "*hotjar.com*", "*segment.io*",
+    "*branch.io*", "*appsflyer.com*", "*newrelic.com*", "*nr-data.net*",
+]
+# Restart a worker's browser after this many page loads or this much memory
+DRIVER_MAX_PAGES = 50
+DRIVER_MAX_MEMORY_MB = 1500
+
+# Reviews waiting for the DB writer before scraping blocks, and how long the
+# writer lets a partial batch sit before writing it
+WRITE_QUEUE_SIZE = 2000
+WRITE_FLUSH_INTERVAL = 1.0
+
+# How often --prometheus-file is rewritten during a crawl, in seconds
+METRICS_EXPORT_INTERVAL = 30
+
+# Distributed crawl (--role coordinator / worker): job lease length, how often
+# a worker renews the leases it holds, attempts before a job is marked failed,
+# and how long an idle worker waits before polling for new jobs (seconds)
+JOB_LEASE_SECONDS = 600
+JOB_HEARTBEAT_SECONDS = 60
+JOB_MAX_ATTEMPTS = 3
+JOB_POLL_INTERVAL = 5
+# How long a worker that has not seen any job yet waits for the coordinator to
+# seed the queue before it gives up (seconds)
+JOB_IDLE_TIMEOUT = 600
@@ -0,0 +1,105 @@
+from datetime import datetime, timezone
+import sqlite3
+import threading
+
+SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    started_at TEXT
+);
+CREATE TABLE IF NOT EXISTS listing_pages (
+    page INTEGER PRIMARY KEY,
+    done_at TEXT
+);
+CREATE TABLE IF NOT EXISTS vendors (
+    link TEXT PRIMARY KEY,
+    restaurant_name TEXT,
+    done_at TEXT,
+    newest_review_key TEXT,
+    seen_run INTEGER
+);
+"""
+
+
+class CrawlState:
+    # Local SQLite record of which listing pages and vendors the current run
+    # has finished, and the newest review stored for each vendor. The newest
+    # review survives new runs so re-scrapes can stop at already known reviews.
+    # Each vendor also records the last run that saw it on the listing, so a
+    # resumed run only picks up the vendors of the run it continues.
+    def __init__(self, path):
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.db:
+            self.db.executescript(SCHEMA_SQL)
+            columns = [row[1] for row in self.db.execute("PRAGMA table_info(vendors)")]
+            if "seen_run" not in columns:
+                # State files written before runs were tracked
+                self.db.execute("ALTER TABLE vendors ADD COLUMN seen_run INTEGER")
+            row = self.db.execute("SELECT max(id) FROM runs").fetchone()
+        self.run_id = row[0]
+
+    def start_new_run(self):
+        with self.lock, self.db:
+            self.run_id = self.db.execute("INSERT INTO runs (started_at) VALUES (?)", (_now(),)).lastrowid
+            self.db.execute("DELETE FROM listing_pages")
+            self.db.execute("UPDATE vendors SET done_at = NULL")
+
+    def listing_page_done(self, page):
+        with self.lock:
+            row = self.db.execute("SELECT done_at FROM listing_pages WHERE page = ?", (page,)).fetchone()
+        return row is not None and row[0] is not None
+
+    def mark_listing_page_done(self, page):
+        with self.lock, self.db:
+            self.db.execute(
+                "INSERT INTO listing_pages (page, done_at) VALUES (?, ?) "
+                "ON CONFLICT (page) DO UPDATE SET done_at = excluded.done_at",
+                (page, _now())
+            )
+
+    def add_vendor(self, link, restaurant_name):
+        with self.lock, self.db:
+            self.db.execute(
+                "INSERT INTO vendors (link, restaurant_name, seen_run) VALUES (?, ?, ?) "
+                "ON CONFLICT (link) DO UPDATE SET restaurant_name = excluded.restaurant_name, "
+                "seen_run = excluded.seen_run",
+                (link, restaurant_name, self.run_id)
+            )
+
+    def pending_vendors(self):
+        # Vendors the current run found on the listing but has not stored yet
+        with self.lock:
+            return self.db.execute(
+                "SELECT link, restaurant_name FROM vendors WHERE seen_run = ? AND done_at IS NULL",
+                (self.run_id,)
+            ).fetchall()
+
+    def vendor_done(self, link):
+        with self.lock:
+            row = self.db.execute("SELECT done_at FROM vendors WHERE link = ?", (link,)).fetchone()
+        return row is not None and row[0] is not None
+
+    def newest_review_key(self, link):
+        with self.lock:
+            row = self.db.execute("SELECT newest_review_key FROM vendors WHERE link = ?", (link,)).fetchone()
+        return row[0] if row else None
+
+    def mark_vendor_done(self, link, restaurant_name, newest_review_key):
+        # newest_review_key is None when the run found nothing new; keep the old one then
+        with self.lock, self.db:
+            self.db.execute(
+                "INSERT INTO vendors (link, restaurant_name, done_at, newest_review_key) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (link) DO UPDATE SET restaurant_name = excluded.restaurant_name, "
+                "done_at = excluded.done_at, "
+                "newest_review_key = coalesce(excluded.newest_review_key, vendors.newest_review_key)",
+                (link, restaurant_name, _now(), newest_review_key)
+            )
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
@@ -0,0 +1,60 @@
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import config
+import metrics
+from page_parser import NeedsBrowser, parse_embedded_reviews, parse_review_page
+from review_scraper import add_reviews
+
+HTTP_HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 "
+        "(KHTML, like Gecko) Chrome/124.0 Safari/537.36"
+    ),
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "en-US,en;q=0.9",
+}
+
+
+def create_session(pool_size=config.HTTP_POOL_SIZE):
+    session = requests.Session()
+    retries = Retry(
+        total=config.HTTP_CONNECT_RETRIES, connect=config.HTTP_CONNECT_RETRIES, read=0, status=0, other=0,
+        backoff_factor=config.HTTP_RETRY_BACKOFF, raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retries)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update(HTTP_HEADERS)
+    return session
+
+
+def fetch_html(session, url):
+    response = session.get(url, timeout=config.HTTP_TIMEOUT)
+    response.raise_for_status()
+    return response.text
+
+
+def restaurant_reviews_from_html(html, restaurant_name, known_review_key=None):
+    # Reads the reviews rendered into a fetched restaurant page. When a
+    # load-more button hides older reviews, the page state embedded in the
+    # page is read instead if it holds more of them. Restaurants whose new
+    # reviews are still out of reach, or whose page has no review markup,
+    # raise NeedsBrowser so the caller can fall back to Selenium.
+    with metrics.stage("parse"):
+        review_fields, has_more = parse_review_page(html)
+        if has_more:
+            embedded_fields, total = parse_embedded_reviews(html)
+            if len(embedded_fields) > len(review_fields):
+                metrics.count("embedded_state_pages")
+                review_fields = embedded_fields
+                has_more = total is None or len(embedded_fields) < total
+    if not review_fields:
+        raise NeedsBrowser("No reviews in the server-rendered page")
+
+    reviews = []
+    reached_known = add_reviews(reviews, set(), review_fields, restaurant_name, known_review_key)
+    if has_more and not reached_known:
+        raise NeedsBrowser("More reviews behind the load-more button", markup_missing=False)
+    metrics.count("reviews_found", len(reviews))
+    return reviews
@@ -0,0 +1,329 @@
+# Crawl jobs shared through PostgreSQL so several processes, on any number of
+# hosts, can work on one crawl:
+#
+#   python updated_talabat_script.py --role coordinator      # seed listing pages
+#   python updated_talabat_script.py --role worker --workers 4   # on every node
+#
+# Workers claim jobs with FOR UPDATE SKIP LOCKED under a lease. While a job is
+# being worked on its lease is renewed by a heartbeat; if the process dies the
+# lease runs out and another worker picks the job up again. The per-host
+# request budget is kept in Postgres too, so --requests-per-second and
+# --max-requests-per-second limit the whole crawl however many nodes join it;
+# raise the cap along with the node count.
+#
+# tests/test_distributed_crawl.py runs a coordinator and several worker
+# processes against one local Postgres and a stand-in for the site.
+from collections import namedtuple
+from urllib.parse import urlparse
+import os
+import socket
+import threading
+import time
+import psycopg2
+from psycopg2.extras import execute_values
+from review_store import connect_to_db
+import config
+import metrics
+
+Job = namedtuple("Job", ["id", "kind", "target", "restaurant_name"])
+
+LISTING_PAGE = "listing_page"
+VENDOR = "vendor"
+
+# Sent as one query string, so it runs as one transaction. The advisory lock
+# keeps processes starting at the same time from racing on IF NOT EXISTS.
+CREATE_TABLES_SQL = """
+SELECT pg_advisory_xact_lock(hashtext('talabat crawl_jobs schema'));
+CREATE TABLE IF NOT EXISTS crawl_jobs (
+    id bigserial PRIMARY KEY,
+    kind text NOT NULL,
+    target text NOT NULL,
+    restaurant_name text,
+    status text NOT NULL DEFAULT 'pending',
+    attempts integer NOT NULL DEFAULT 0,
+    leased_by text,
+    lease_expires_at timestamptz,
+    last_error text,
+    created_at timestamptz NOT NULL DEFAULT now(),
+    finished_at timestamptz,
+    UNIQUE (kind, target)
+);
+CREATE INDEX IF NOT EXISTS crawl_jobs_status_idx ON crawl_jobs (status, id);
+CREATE TABLE IF NOT EXISTS vendor_review_state (
+    link text PRIMARY KEY,
+    restaurant_name text,
+    newest_review_key text,
+    updated_at timestamptz NOT NULL DEFAULT now()
+);
+CREATE TABLE IF NOT EXISTS host_rate_limits (
+    host text PRIMARY KEY,
+    tokens double precision NOT NULL,
+    rate double precision NOT NULL,
+    updated_at timestamptz NOT NULL DEFAULT clock_timestamp()
+);
+"""
+
+# Pending jobs first, then running jobs whose worker stopped renewing the lease
+CLAIM_JOB_SQL = """
+UPDATE crawl_jobs
+SET status = 'running',
+    attempts = attempts + 1,
+    leased_by = %(worker)s,
+    lease_expires_at = now() + %(lease)s * interval '1 second'
+WHERE id = (
+    SELECT id FROM crawl_jobs
+    WHERE (status = 'pending' OR (status = 'running' AND lease_expires_at < now()))
+      AND attempts < %(max_attempts)s
+    ORDER BY status, id
+    LIMIT 1
+    FOR UPDATE SKIP LOCKED
+)
+RETURNING id, kind, target, restaurant_name
+"""
+
+# Refills the host's bucket and takes a token in one statement, creating the
+# bucket if it does not exist (first request, or --reset-jobs emptied the
+# table). The token is taken even when the bucket is empty; the caller then
+# waits until the debt is paid back, so concurrent callers queue up in the
+# order they reserved.
+RESERVE_REQUEST_SQL = """
+INSERT INTO host_rate_limits AS limits (host, tokens, rate, updated_at)
+VALUES (%(host)s, %(burst)s - 1, %(rate)s, clock_timestamp())
+ON CONFLICT (host) DO UPDATE
+SET tokens = least(
+        %(burst)s,
+        limits.tokens + greatest(0, extract(epoch FROM excluded.updated_at - limits.updated_at)::float8) * limits.rate
+    ) - 1,
+    updated_at = greatest(limits.updated_at, excluded.updated_at)
+RETURNING limits.tokens, limits.rate
+"""
+
+
+class JobQueue:
+    # One per process. The connection runs in autocommit mode: every statement
+    # is its own transaction, so the worker threads can share it. A statement
+    # that fails because the connection was lost is run once more on a new
+    # connection. Every statement here can be repeated safely: a claim whose
+    # result was lost only holds its job until the lease runs out.
+    def __init__(self, lease_seconds=config.JOB_LEASE_SECONDS, max_attempts=config.JOB_MAX_ATTEMPTS):
+        self.conn = None
+        self.conn_lock = threading.Lock()
+        self._connection()
+        self.worker = f"{socket.gethostname()}:{os.getpid()}"
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.lock = threading.Lock()
+        self.active_jobs = set()
+        self.stopped = threading.Event()
+        self.heartbeat = None
+        # Set once this process has seen unfinished jobs; until then an empty
+        # queue means the coordinator has not seeded it yet
+        self.seen_jobs = False
+
+    def _connection(self):
+        with self.conn_lock:
+            if self.conn is None or self.conn.closed:
+                conn = connect_to_db()
+                if not conn:
+                    raise Exception("Failed to connect to the database.")
+                conn.autocommit = True
+                self.conn = conn
+            return self.conn
+
+    def _drop_connection(self, conn):
+        with self.conn_lock:
+            if self.conn is conn:
+                self.conn = None
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def run(self, statement):
+        # statement(cursor) -> result
+        for attempt in range(2):
+            conn = self._connection()
+            try:
+                with conn.cursor() as cur:
+                    return statement(cur)
+            except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+                if attempt:
+                    raise
+                print(f"Lost the job queue connection, reconnecting: {e}")
+                metrics.count("db_reconnects")
+                self._drop_connection(conn)
+
+    def execute(self, sql, params=None, fetch=False):
+        def statement(cur):
+            cur.execute(sql, params)
+            if fetch:
+                return cur.fetchall()
+            return cur.rowcount
+
+        return self.run(statement)
+
+    def create_tables(self):
+        self.execute(CREATE_TABLES_SQL)
+
+    def reset(self):
+        self.execute("TRUNCATE crawl_jobs, host_rate_limits")
+
+    def add_jobs(self, kind, targets):
+        # targets: (target, restaurant_name) pairs. Jobs that already exist are kept as they are.
+        rows = [(kind, str(target), restaurant_name) for target, restaurant_name in targets]
+        if not rows:
+            return 0
+        added = self.run(lambda cur: execute_values(
+            cur,
+            "INSERT INTO crawl_jobs (kind, target, restaurant_name) VALUES %s "
+            "ON CONFLICT (kind, target) DO NOTHING RETURNING 1",
+            rows, page_size=len(rows), fetch=True
+        ))
+        return len(added)
+
+    def claim(self):
+        rows = self.execute(
+            CLAIM_JOB_SQL,
+            {"worker": self.worker, "lease": self.lease_seconds, "max_attempts": self.max_attempts},
+            fetch=True
+        )
+        if not rows:
+            return None
+        job = Job(*rows[0])
+        self.seen_jobs = True
+        with self.lock:
+            self.active_jobs.add(job.id)
+        metrics.count("jobs_claimed")
+        return job
+
+    def complete(self, job_id):
+        self._release(job_id)
+        self.execute(
+            "UPDATE crawl_jobs SET status = 'done', finished_at = now(), lease_expires_at = NULL "
+            "WHERE id = %s AND leased_by = %s AND status = 'running'",
+            (job_id, self.worker)
+        )
+
+    def fail(self, job_id, error):
+        # Back to pending for another attempt, or failed once attempts run out
+        self._release(job_id)
+        self.execute(
+            "UPDATE crawl_jobs SET status = CASE WHEN attempts >= %s THEN 'failed' ELSE 'pending' END, "
+            "last_error = %s, lease_expires_at = NULL "
+            "WHERE id = %s AND leased_by = %s AND status = 'running'",
+            (self.max_attempts, str(error), job_id, self.worker)
+        )
+        metrics.count("job_retries")
+
+    def _release(self, job_id):
+        with self.lock:
+            self.active_jobs.discard(job_id)
+
+    def unfinished_jobs(self):
+        # Expired leases that used up their attempts can never be claimed again
+        self.execute(
+            "UPDATE crawl_jobs SET status = 'failed', last_error = 'lease expired' "
+            "WHERE status = 'running' AND lease_expires_at < now() AND attempts >= %s",
+            (self.max_attempts,)
+        )
+        rows = self.execute("SELECT count(*) FROM crawl_jobs WHERE status IN ('pending', 'running')", fetch=True)
+        if rows[0][0]:
+            self.seen_jobs = True
+        return rows[0][0]
+
+    def progress(self):
+        rows = self.execute("SELECT status, count(*) FROM crawl_jobs GROUP BY status ORDER BY status", fetch=True)
+        return dict(rows)
+
+    def start_heartbeat(self, interval=config.JOB_HEARTBEAT_SECONDS):
+        def run():
+            while not self.stopped.wait(interval):
+                with self.lock:
+                    job_ids = list(self.active_jobs)
+                if not job_ids:
+                    continue
+                try:
+                    self.execute(
+                        "UPDATE crawl_jobs SET lease_expires_at = now() + %s * interval '1 second' "
+                        "WHERE id = ANY(%s) AND leased_by = %s AND status = 'running'",
+                        (self.lease_seconds, job_ids, self.worker)
+                    )
+                except Exception as e:
+                    print(f"Error renewing job leases: {e}")
+
+        self.heartbeat = threading.Thread(target=run, name="job-heartbeat", daemon=True)
+        self.heartbeat.start()
+
+    def close(self):
+        self.stopped.set()
+        if self.heartbeat:
+            self.heartbeat.join()
+        if self.conn:
+            self.conn.close()
+
+
+class PostgresCrawlState:
+    # Same newest-review bookkeeping as crawl_state.CrawlState, kept in
+    # Postgres so every node sees what the others stored.
+    def __init__(self, job_queue):
+        self.jobs = job_queue
+
+    def newest_review_key(self, link):
+        rows = self.jobs.execute(
+            "SELECT newest_review_key FROM vendor_review_state WHERE link = %s", (link,), fetch=True
+        )
+        return rows[0][0] if rows else None
+
+    def mark_vendor_done(self, link, restaurant_name, newest_review_key):
+        self.jobs.execute(
+            "INSERT INTO vendor_review_state (link, restaurant_name, newest_review_key) VALUES (%s, %s, %s) "
+            "ON CONFLICT (link) DO UPDATE SET restaurant_name = excluded.restaurant_name, "
+            "newest_review_key = coalesce(excluded.newest_review_key, vendor_review_state.newest_review_key), "
+            "updated_at = now()",
+            (link, restaurant_name, newest_review_key)
+        )
+
+
+class PostgresRateLimiter:
+    # Same interface and token bucket as pacing.HostRateLimiter, but the
+    # buckets live in Postgres and are shared by every process of the crawl.
+    # A host's rate, backed off or sped up, carries over between processes
+    # until the coordinator runs with --reset-jobs.
+    def __init__(
+        self,
+        job_queue,
+        rate=config.REQUESTS_PER_SECOND,
+        burst=config.REQUEST_BURST,
+        min_rate=config.MIN_REQUESTS_PER_SECOND,
+        max_rate=config.MAX_REQUESTS_PER_SECOND,
+    ):
+        self.jobs = job_queue
+        self.initial_rate = rate
+        self.burst = burst
+        # A starting rate outside the limits widens them; otherwise the first
+        # healthy response would pull it back to max_rate
+        self.min_rate = min(min_rate, rate)
+        self.max_rate = max(max_rate, rate)
+
+    def acquire(self, url):
+        rows = self.jobs.execute(
+            RESERVE_REQUEST_SQL,
+            {"host": urlparse(url).netloc, "burst": float(self.burst), "rate": self.initial_rate},
+            fetch=True
+        )
+        tokens, rate = rows[0]
+        if tokens < 0:
+            with metrics.stage("rate_limit_wait"):
+                time.sleep(-tokens / rate)
+
+    def report_success(self, url):
+        self.jobs.execute(
+            "UPDATE host_rate_limits SET rate = least(%s, rate + %s) WHERE host = %s",
+            (self.max_rate, config.RATE_SPEEDUP_STEP, urlparse(url).netloc)
+        )
+
+    def report_error(self, url):
+        self.jobs.execute(
+            "UPDATE host_rate_limits SET rate = greatest(%s, rate * %s), tokens = least(tokens, 0) WHERE host = %s",
+            (self.min_rate, config.RATE_BACKOFF_FACTOR, urlparse(url).netloc)
+        )
@@ -0,0 +1,228 @@
+# Stage timers and counters for a crawl. Call sites use the module-level
+# stage() / count() / observe() / restaurant() helpers; until enable() is called
+# they go to a no-op collector, so instrumentation costs a function call when
+# disabled.
+from contextlib import contextmanager, nullcontext
+import json
+import os
+import sys
+import threading
+import time
+
+_NULL_CONTEXT = nullcontext()
+
+
+class NullMetrics:
+    def stage(self, name):
+        return _NULL_CONTEXT
+
+    def restaurant(self, key, name=None):
+        return _NULL_CONTEXT
+
+    def booked_to(self, key):
+        return _NULL_CONTEXT
+
+    def count(self, name, amount=1):
+        pass
+
+    def observe(self, name, value):
+        pass
+
+
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.started = time.time()
+        self.stage_seconds = {}
+        self.stage_calls = {}
+        self.counters = {}
+        self.observations = {}  # name -> [total, count]
+        self.restaurants = {}  # vendor link -> {stage: seconds}
+        self.restaurant_names = {}  # vendor link -> restaurant name
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            restaurant = getattr(self.local, "restaurant", None)
+            with self.lock:
+                self.stage_seconds[name] = self.stage_seconds.get(name, 0.0) + elapsed
+                self.stage_calls[name] = self.stage_calls.get(name, 0) + 1
+                if restaurant is not None:
+                    stages = self.restaurants.setdefault(restaurant, {})
+                    stages[name] = stages.get(name, 0.0) + elapsed
+
+    @contextmanager
+    def restaurant(self, key, name=None):
+        # Times the block as the restaurant's own stage. key is the vendor
+        # link: branches of a chain share a name but not a link.
+        if name is not None:
+            with self.lock:
+                self.restaurant_names[key] = name
+        with self.booked_to(key):
+            with self.stage("restaurant"):
+                yield
+
+    @contextmanager
+    def booked_to(self, key):
+        # Stages timed in this thread inside the block are also booked to the
+        # restaurant, e.g. the writer thread's inserts for it
+        previous = getattr(self.local, "restaurant", None)
+        self.local.restaurant = key
+        try:
+            yield
+        finally:
+            self.local.restaurant = previous
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def observe(self, name, value):
+        # One measurement of something other than a stage, e.g. time to first
+        # review or bytes per page; the summary reports the total and the mean
+        restaurant = getattr(self.local, "restaurant", None)
+        with self.lock:
+            observation = self.observations.setdefault(name, [0.0, 0])
+            observation[0] += value
+            observation[1] += 1
+            if restaurant is not None:
+                stages = self.restaurants.setdefault(restaurant, {})
+                stages[name] = stages.get(name, 0.0) + value
+
+    def summary(self):
+        with self.lock:
+            return {
+                "elapsed_seconds": round(time.time() - self.started, 3),
+                "stages": {
+                    name: {"seconds": round(seconds, 3), "calls": self.stage_calls[name]}
+                    for name, seconds in sorted(self.stage_seconds.items())
+                },
+                "counters": dict(sorted(self.counters.items())),
+                "observations": {
+                    name: {"total": round(total, 3), "count": count, "mean": round(total / count, 3)}
+                    for name, (total, count) in sorted(self.observations.items())
+                },
+                "restaurants": {
+                    key: {
+                        "name": self.restaurant_names.get(key),
+                        "stages": {stage: round(seconds, 3) for stage, seconds in sorted(stages.items())},
+                    }
+                    for key, stages in self.restaurants.items()
+                },
+            }
+
+    def write_json(self, path):
+        summary = json.dumps(self.summary(), indent=2, ensure_ascii=False)
+        if path == "-":
+            print(summary)
+        else:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(summary + "\n")
+
+    def write_prometheus(self, path):
+        # Text exposition format, for node_exporter's textfile collector
+        with self.lock:
+            lines = [
+                "# TYPE talabat_stage_seconds_total counter",
+                *(f'talabat_stage_seconds_total{{stage="{name}"}} {seconds:.6f}'
+                  for name, seconds in sorted(self.stage_seconds.items())),
+                "# TYPE talabat_stage_calls_total counter",
+                *(f'talabat_stage_calls_total{{stage="{name}"}} {calls}'
+                  for name, calls in sorted(self.stage_calls.items())),
+                "# TYPE talabat_events_total counter",
+                *(f'talabat_events_total{{event="{name}"}} {value}'
+                  for name, value in sorted(self.counters.items())),
+                "# TYPE talabat_observation summary",
+                *(line for name, (total, count) in sorted(self.observations.items()) for line in (
+                    f'talabat_observation_sum{{name="{name}"}} {total:.6f}',
+                    f'talabat_observation_count{{name="{name}"}} {count}',
+                )),
+            ]
+        # Write then rename so the collector never reads a half-written file
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(temp_path, path)
+
+
+_active = NullMetrics()
+
+
+def enable():
+    global _active
+    _active = Metrics()
+    return _active
+
+
+def stage(name):
+    return _active.stage(name)
+
+
+def restaurant(key, name=None):
+    return _active.restaurant(key, name)
+
+
+def booked_to(key):
+    return _active.booked_to(key)
+
+
+def count(name, amount=1):
+    _active.count(name, amount)
+
+
+def observe(name, value):
+    _active.observe(name, value)
+
+
+def export_prometheus_periodically(collector, path, interval):
+    # Rewrites the text file every interval seconds until the returned event is set
+    stopped = threading.Event()
+
+    def run():
+        while not stopped.wait(interval):
+            collector.write_prometheus(path)
+
+    threading.Thread(target=run, name="prometheus-export", daemon=True).start()
+    return stopped
+
+
+class SamplingProfiler:
+    # Samples the stack of every thread at a fixed interval and writes them in
+    # collapsed "frame;frame;frame count" form, which flamegraph.pl and
+    # speedscope read. Unlike cProfile it covers all worker threads at once.
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.samples = {}
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self.stopped.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                key = ";".join(reversed(stack))
+                self.samples[key] = self.samples.get(key, 0) + 1
+
+    def stop(self, path):
+        self.stopped.set()
+        self.thread.join()
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, samples in sorted(self.samples.items()):
+                f.write(f"{stack} {samples}\n")
+        print(f"Profile written to {path}")
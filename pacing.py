@@ -0,0 +1,58 @@
+from urllib.parse import urlparse
+import threading
+import time
+import config
+import metrics
+
+
+class HostRateLimiter:
+    # Token bucket per host, shared by all workers. The refill rate backs off
+    # multiplicatively on errors and creeps back up while responses are healthy.
+    def __init__(
+        self,
+        rate=config.REQUESTS_PER_SECOND,
+        burst=config.REQUEST_BURST,
+        min_rate=config.MIN_REQUESTS_PER_SECOND,
+        max_rate=config.MAX_REQUESTS_PER_SECOND,
+    ):
+        self.initial_rate = rate
+        self.burst = burst
+        # A starting rate outside the limits widens them; otherwise the first
+        # healthy response would pull it back to max_rate
+        self.min_rate = min(min_rate, rate)
+        self.max_rate = max(max_rate, rate)
+        self.lock = threading.Lock()
+        self.buckets = {}  # host -> [tokens, rate, last refill time]
+
+    def _bucket(self, host):
+        bucket = self.buckets.get(host)
+        if bucket is None:
+            bucket = self.buckets[host] = [float(self.burst), self.initial_rate, time.monotonic()]
+        return bucket
+
+    def acquire(self, url):
+        host = urlparse(url).netloc
+        while True:
+            with self.lock:
+                bucket = self._bucket(host)
+                now = time.monotonic()
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[2]) * bucket[1])
+                bucket[2] = now
+                if bucket[0] >= 1:
+                    bucket[0] -= 1
+                    return
+                delay = (1 - bucket[0]) / bucket[1]
+            with metrics.stage("rate_limit_wait"):
+                time.sleep(delay)
+
+    def report_success(self, url):
+        with self.lock:
+            bucket = self._bucket(urlparse(url).netloc)
+            bucket[1] = min(self.max_rate, bucket[1] + config.RATE_SPEEDUP_STEP)
+
+    def report_error(self, url):
+        with self.lock:
+            bucket = self._bucket(urlparse(url).netloc)
+            bucket[1] = max(self.min_rate, bucket[1] * config.RATE_BACKOFF_FACTOR)
+            bucket[0] = min(bucket[0], 0.0)
+
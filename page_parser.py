@@ -0,0 +1,148 @@
+from bs4 import BeautifulSoup, SoupStrainer
+import importlib.util
+import json
+
+DEFAULT_BACKEND = "lxml" if importlib.util.find_spec("lxml") else "html.parser"
+
+PAGINATION_ATTRS = {"data-test": "pagination"}
+VENDOR_ATTRS = {"data-testid": "vendor"}
+VENDOR_NAME_ATTRS = {"data-testid": "vendor-name"}
+REVIEW_ITEM_ATTRS = {"data-testid": "reviews-item-component"}
+REVIEW_TEXT_ATTRS = {"data-testid": "customer-review"}
+CUSTOMER_NAME_ATTRS = {"data-testid": "customer-name"}
+RATING_ATTRS = {"data-testid": "restaurant-rating-comp"}
+LOAD_MORE_ATTRS = {"data-testid": "btn-load-more"}
+NEXT_DATA_ATTRS = {"id": "__NEXT_DATA__"}
+
+# Key names of a review object, and of the review count next to the list of
+# them, in the page state Next.js embeds in the __NEXT_DATA__ script
+EMBEDDED_TEXT_KEYS = ("review", "comment", "reviewText")
+EMBEDDED_RATING_KEYS = ("rate", "rating")
+EMBEDDED_AUTHOR_KEYS = ("customerName", "userName", "authorName")
+EMBEDDED_TOTAL_KEYS = ("totalReviews", "totalCount", "total")
+
+
+class NeedsBrowser(Exception):
+    # Raised when a page cannot be fully read without rendering it in a
+    # browser. markup_missing is False when the page looks fine and only has
+    # more content behind a load-more button; missing markup on a 200
+    # response is also what bot challenges look like.
+    def __init__(self, message, markup_missing=True):
+        super().__init__(message)
+        self.markup_missing = markup_missing
+
+
+# Only these subtrees are built into the soup; everything else on the page is
+# skipped by the tokenizer.
+PAGINATION_ONLY = SoupStrainer("ul", attrs=PAGINATION_ATTRS)
+VENDOR_CARDS_ONLY = SoupStrainer("div", attrs=VENDOR_ATTRS)
+REVIEWS_ONLY = SoupStrainer(attrs={"data-testid": [REVIEW_ITEM_ATTRS["data-testid"], LOAD_MORE_ATTRS["data-testid"]]})
+NEXT_DATA_ONLY = SoupStrainer("script", attrs=NEXT_DATA_ATTRS)
+
+
+def make_soup(html, parse_only, backend=None, targeted=True):
+    # targeted=False parses the whole page, as the scripts originally did
+    return BeautifulSoup(html, backend or DEFAULT_BACKEND, parse_only=parse_only if targeted else None)
+
+
+def parse_total_number_of_pages(html, backend=None, targeted=True):
+    soup = make_soup(html, PAGINATION_ONLY, backend, targeted)
+    pagination = soup.find("ul", attrs=PAGINATION_ATTRS)
+    if pagination is None:
+        # Bot challenge or a listing rendered client-side
+        raise NeedsBrowser("No pagination in the page")
+    return int(pagination.find_all("li")[-2].find("a").text)
+
+
+def parse_vendor_cards(html, backend=None, targeted=True):
+    # Returns (restaurant_page_link, restaurant_name) per vendor card
+    soup = make_soup(html, VENDOR_CARDS_ONLY, backend, targeted)
+    vendors = []
+    for card in soup.find_all("div", attrs=VENDOR_ATTRS):
+        restaurant_page_link = card.find("a")["href"]
+        restaurant_name = card.find("p", attrs=VENDOR_NAME_ATTRS).text
+        vendors.append((restaurant_page_link, restaurant_name))
+    if not vendors:
+        raise NeedsBrowser("No vendor cards in the page")
+    return vendors
+
+
+def parse_review_page(html, backend=None, targeted=True):
+    # Same fields as review_scraper.EXTRACT_NEW_REVIEWS_JS, read from static
+    # HTML, plus whether the page still offers a "load more" button.
+    soup = make_soup(html, REVIEWS_ONLY, backend, targeted)
+    fields = []
+    for review in soup.find_all("div", attrs=REVIEW_ITEM_ATTRS):
+        text = review.find("p", attrs=REVIEW_TEXT_ATTRS)
+        author = review.find("div", attrs=CUSTOMER_NAME_ATTRS)
+        rating_comp = review.find("div", attrs=RATING_ATTRS)
+        rating_outer = rating_comp and rating_comp.find("div")
+        rating = rating_outer and rating_outer.find("div")
+        fields.append((
+            text and text.text,
+            rating and rating.text,
+            author and author.text,
+        ))
+    has_more = soup.find("button", attrs=LOAD_MORE_ATTRS) is not None
+    return fields, has_more
+
+
+def parse_embedded_reviews(html, backend=None, targeted=True):
+    # Reviews from the page state embedded as JSON, in the same fields as
+    # parse_review_page, plus the review count the state reports (None if it
+    # has none). Returns ([], None) when the page embeds no reviews.
+    soup = make_soup(html, NEXT_DATA_ONLY, backend, targeted)
+    script = soup.find("script", attrs=NEXT_DATA_ATTRS)
+    if script is None or not script.string:
+        return [], None
+    try:
+        state = json.loads(script.string)
+    except ValueError:
+        return [], None
+    found = _find_embedded_reviews(state)
+    if found is None:
+        return [], None
+    items, total = found
+    fields = []
+    for item in items:
+        rating = _first_value(item, EMBEDDED_RATING_KEYS)
+        fields.append((
+            _first_value(item, EMBEDDED_TEXT_KEYS),
+            None if rating is None else str(rating),
+            _first_value(item, EMBEDDED_AUTHOR_KEYS),
+        ))
+    return fields, total if isinstance(total, int) else None
+
+
+def _find_embedded_reviews(node):
+    # Depth-first search for the first list of review objects, returned with
+    # the review count stored next to it
+    if isinstance(node, dict):
+        children = node.values()
+        for value in children:
+            if isinstance(value, list) and value and all(_is_embedded_review(item) for item in value):
+                return value, _first_value(node, EMBEDDED_TOTAL_KEYS)
+    elif isinstance(node, list):
+        children = node
+    else:
+        return None
+    for value in children:
+        found = _find_embedded_reviews(value)
+        if found is not None:
+            return found
+    return None
+
+
+def _is_embedded_review(item):
+    return (
+        isinstance(item, dict)
+        and _first_value(item, EMBEDDED_TEXT_KEYS) is not None
+        and _first_value(item, EMBEDDED_AUTHOR_KEYS) is not None
+    )
+
+
+def _first_value(item, keys):
+    for key in keys:
+        if key in item:
+            return item[key]
+    return None
@@ -0,0 +1,135 @@
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+import logging
+import config
+import metrics
+from review_store import Review, review_key
+
+REVIEW_SOURCE = "Talabat"
+REVIEW_XPATH = '//div[@data-testid="reviews-item-component"]'
+LOAD_MORE_XPATH = '//button[@data-testid="btn-load-more"]'
+
+# Returns [review_text, rating, author_name] for every review node from index
+# arguments[0] onwards, so each load-more round only ships the new reviews.
+# The rating lookup mirrors find("div", ...).find("div").find("div").
+EXTRACT_NEW_REVIEWS_JS = """
+const items = document.querySelectorAll('div[data-testid="reviews-item-component"]');
+const fields = [];
+for (let i = arguments[0]; i < items.length; i++) {
+    const item = items[i];
+    const text = item.querySelector('p[data-testid="customer-review"]');
+    const author = item.querySelector('div[data-testid="customer-name"]');
+    const ratingComp = item.querySelector('div[data-testid="restaurant-rating-comp"]');
+    const ratingOuter = ratingComp && ratingComp.querySelector('div');
+    const rating = ratingOuter && ratingOuter.querySelector('div');
+    fields.push([
+        text && text.textContent,
+        rating && rating.textContent,
+        author && author.textContent,
+    ]);
+}
+return fields;
+"""
+
+
+def add_reviews(reviews, seen_reviews, review_fields, restaurant_name, known_review_key=None):
+    # Appends a Review per new, complete set of fields. Returns True once it reaches the newest review stored by a previous run;
+    # that review and everything after it are already known.
+    for review_text, rating, author_name in review_fields:
+        if review_text is None:
+            logging.error("Error processing review: missing review text")
+            metrics.count("parse_failures")
+            continue
+        if review_text in seen_reviews:
+            continue
+        seen_reviews.add(review_text)
+        if rating is None or author_name is None:
+            logging.error(f"Error processing review: missing rating or author for {review_text!r}")
+            metrics.count("parse_failures")
+            continue
+        if known_review_key and review_key(review_text, author_name, restaurant_name) == known_review_key:
+            return True
+        reviews.append(Review(review_text, rating, author_name, restaurant_name, REVIEW_SOURCE))
+    return False
+
+
+def click_read_more(driver):
+    # The button is either rendered with the reviews or not at all, so only
+    # wait briefly for it instead of the full page timeout.
+    try:
+        read_more_button = WebDriverWait(driver, config.LOAD_MORE_BUTTON_TIMEOUT).until(
+            EC.element_to_be_clickable((By.XPATH, LOAD_MORE_XPATH))
+        )
+        read_more_button.click()
+        return True
+    except:
+        return False
+
+
+def wait_for_more_reviews(driver, previous_count):
+    # Returns once the click has loaded more reviews or the button is gone
+    def more_reviews_loaded(driver):
+        if len(driver.find_elements(By.XPATH, REVIEW_XPATH)) > previous_count:
+            return True
+        return not driver.find_elements(By.XPATH, LOAD_MORE_XPATH)
+
+    try:
+        WebDriverWait(driver, config.LOAD_MORE_RESULT_TIMEOUT, poll_frequency=0.2).until(more_reviews_loaded)
+        return True
+    except TimeoutException:
+        return False
+
+
+def wait_for_first_review(driver):
+    with metrics.stage("wait_first_review"):
+        WebDriverWait(driver, config.REVIEWS_TIMEOUT).until(EC.presence_of_element_located((By.XPATH, REVIEW_XPATH)))
+
+
+def iter_reviews(driver, restaurant_name, limiter, known_review_key=None, wait_for_first=True):
+    # Expand the reviews with "load more" and yield them as Review records
+    # round by round, reading only the review nodes added since the previous
+    # click. Stops expanding once known_review_key (newest review of the last
+    # run) shows up.
+    # Returns True when every review was read: known_review_key was reached or
+    # the load-more button is gone. False means a click failed or timed out
+    # while the button was still there, so older reviews may have been missed.
+    # Pass wait_for_first=False when the caller already waited for the first
+    # review.
+    if wait_for_first:
+        wait_for_first_review(driver)
+
+    seen_reviews = set()  # Track seen reviews to avoid duplicates
+    extracted_count = 0
+
+    while True:
+        with metrics.stage("extract_reviews"):
+            new_reviews = driver.execute_script(EXTRACT_NEW_REVIEWS_JS, extracted_count)
+        if not new_reviews:
+            break  # Stop if no new reviews are loaded
+        extracted_count += len(new_reviews)
+        print("Extracted reviews")
+
+        reviews = []
+        reached_known = add_reviews(reviews, seen_reviews, new_reviews, restaurant_name, known_review_key)
+        metrics.count("reviews_found", len(reviews))
+        yield from reviews
+        if reached_known:
+            print(f"{restaurant_name}: reached already known reviews")
+            return True
+        if not driver.find_elements(By.XPATH, LOAD_MORE_XPATH):
+            return True  # Every review is on the page, nothing left to request
+
+        limiter.acquire(driver.current_url)
+        with metrics.stage("load_more"):
+            if not click_read_more(driver):
+                break
+            loaded = wait_for_more_reviews(driver, extracted_count)
+        if loaded:
+            limiter.report_success(driver.current_url)
+        else:
+            metrics.count("load_more_timeouts")
+            limiter.report_error(driver.current_url)
+
+    return not driver.find_elements(By.XPATH, LOAD_MORE_XPATH)
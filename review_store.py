@@ -0,0 +1,263 @@
+from dataclasses import dataclass
+import hashlib
+import os
+import queue
+import threading
+import psycopg2
+from psycopg2.extras import execute_values
+import config
+import metrics
+
+# Every node of a distributed crawl points these at the same server
+DB_HOST = os.environ.get("TALABAT_DB_HOST", "localhost")
+DB_PORT = os.environ.get("TALABAT_DB_PORT", "5432")
+DB_NAME = os.environ.get("TALABAT_DB_NAME", "talabat_reviews")
+DB_USER = os.environ.get("TALABAT_DB_USER", "postgres")
+DB_PASSWORD = os.environ.get("TALABAT_DB_PASSWORD", "123456")
+
+# Number of reviews sent per INSERT statement / committed per transaction
+INSERT_BATCH_SIZE = 500
+
+# The key is generated by Postgres from the same columns the old duplicate SELECT
+# compared, so existing rows get it too and dedup is done by the unique index.
+REVIEW_KEY_COLUMN_SQL = """
+ALTER TABLE reviews ADD COLUMN IF NOT EXISTS review_key text GENERATED ALWAYS AS (
+    md5(coalesce(review_text, '') || chr(31) || coalesce(author_name, '') || chr(31) || coalesce(restaurant_name, ''))
+) STORED
+"""
+REVIEW_KEY_INDEX_SQL = "CREATE UNIQUE INDEX IF NOT EXISTS reviews_review_key_idx ON reviews (review_key)"
+
+REVIEW_KEY_COLUMN_EXISTS_SQL = """
+SELECT 1 FROM information_schema.columns
+WHERE table_schema = current_schema() AND table_name = 'reviews' AND column_name = 'review_key'
+"""
+REVIEW_KEY_INDEX_EXISTS_SQL = """
+SELECT 1 FROM pg_indexes
+WHERE schemaname = current_schema() AND tablename = 'reviews' AND indexname = 'reviews_review_key_idx'
+"""
+
+# Rows stored twice before the unique index existed; the first copy is kept
+DELETE_DUPLICATE_REVIEWS_SQL = """
+DELETE FROM reviews WHERE ctid IN (
+    SELECT ctid FROM (
+        SELECT ctid, row_number() OVER (PARTITION BY review_key ORDER BY ctid) AS copy
+        FROM reviews
+    ) copies
+    WHERE copy > 1
+)
+"""
+
+INSERT_REVIEWS_SQL = """
+INSERT INTO reviews (review_text, rating, author_name, review_source, restaurant_name)
+VALUES %s
+ON CONFLICT (review_key) DO NOTHING
+RETURNING 1
+"""
+
+
+@dataclass(slots=True, frozen=True)
+class Review:
+    review_text: str
+    rating: str
+    author_name: str
+    restaurant_name: str
+    review_source: str = "Talabat"
+
+    def key(self):
+        return review_key(self.review_text, self.author_name, self.restaurant_name)
+
+
+def connect_to_db():
+    try:
+        conn = psycopg2.connect(
+            host=DB_HOST,
+            port=DB_PORT,
+            database=DB_NAME,
+            user=DB_USER,
+            password=DB_PASSWORD
+        )
+        print("Connected to the database")
+        return conn
+    except Exception as e:
+        print(f"Error connecting to the database: {e}")
+        return None
+
+
+def review_key(review_text, author_name, restaurant_name):
+    # Same value Postgres generates for reviews.review_key
+    key = "\x1f".join((review_text or "", author_name or "", restaurant_name or ""))
+    return hashlib.md5(key.encode("utf-8")).hexdigest()
+
+
+def ensure_review_key(conn):
+    # Runs at every start, including workers joining a running crawl, so the
+    # schema is only touched when something is missing: ALTER TABLE locks
+    # reviews against every writer.
+    with conn.cursor() as cur:
+        cur.execute(REVIEW_KEY_COLUMN_EXISTS_SQL)
+        if cur.fetchone() is None:
+            print("Adding the review_key column to reviews")
+            cur.execute(REVIEW_KEY_COLUMN_SQL)
+        cur.execute(REVIEW_KEY_INDEX_EXISTS_SQL)
+        if cur.fetchone() is None:
+            # No new duplicates may come in between the delete and the index
+            cur.execute("LOCK TABLE reviews IN SHARE ROW EXCLUSIVE MODE")
+            cur.execute(DELETE_DUPLICATE_REVIEWS_SQL)
+            if cur.rowcount:
+                print(f"Removed {cur.rowcount} duplicate reviews before adding the review_key index")
+            cur.execute(REVIEW_KEY_INDEX_SQL)
+    conn.commit()
+
+
+def insert_reviews(conn, reviews, batch_size=INSERT_BATCH_SIZE):
+    # Returns (inserted, skipped) where skipped counts rows that already existed.
+    reviews = [
+        (review.review_text, review.rating, review.author_name, review.review_source, review.restaurant_name)
+        for review in reviews
+    ]
+    inserted = 0
+    failed = 0
+    for start in range(0, len(reviews), batch_size):
+        batch = reviews[start:start + batch_size]
+        try:
+            with metrics.stage("db_write"):
+                with conn.cursor() as cur:
+                    rows = execute_values(cur, INSERT_REVIEWS_SQL, batch, page_size=len(batch), fetch=True)
+                conn.commit()
+            inserted += len(rows)
+        except Exception as e:
+            # A dropped connection is already closed and cannot roll back
+            if not conn.closed:
+                conn.rollback()
+            failed += len(batch)
+            print(f"Error inserting reviews: {e}")
+    skipped = len(reviews) - inserted - failed
+    metrics.count("db_rows_written", inserted)
+    metrics.count("duplicates", skipped)
+    metrics.count("db_write_failures", failed)
+    return inserted, skipped
+
+
+class _RestaurantStart:
+    __slots__ = ("restaurant_key",)
+
+    def __init__(self, restaurant_key):
+        self.restaurant_key = restaurant_key
+
+
+class _RestaurantEnd:
+    __slots__ = ("restaurant_name", "on_stored", "on_failed")
+
+    def __init__(self, restaurant_name, on_stored, on_failed):
+        self.restaurant_name = restaurant_name
+        self.on_stored = on_stored
+        self.on_failed = on_failed
+
+
+class ReviewWriter:
+    # Background thread that owns a DB connection and writes reviews while the
+    # scraper keeps going. put() blocks once WRITE_QUEUE_SIZE reviews are
+    # waiting, which throttles the scraper to the database's pace.
+    def __init__(self, queue_size=config.WRITE_QUEUE_SIZE, batch_size=INSERT_BATCH_SIZE):
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.batch_size = batch_size
+        self.conn = None
+        self.restaurant_key = None
+        self.thread = threading.Thread(target=self._run, name="review-writer", daemon=True)
+        self.inserted = self.skipped = self.failed = 0
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def start_restaurant(self, restaurant_key):
+        # Writes until the next end_restaurant() are booked to restaurant_key
+        # (the vendor link) in the metrics
+        self.queue.put(_RestaurantStart(restaurant_key))
+
+    def put(self, review):
+        self.queue.put(review)
+
+    def end_restaurant(self, restaurant_name, on_stored=None, on_failed=None):
+        # on_stored() is called from the writer thread once every review put
+        # for this restaurant has been written without errors, on_failed()
+        # when some of them could not be written.
+        self.queue.put(_RestaurantEnd(restaurant_name, on_stored, on_failed))
+
+    def close(self):
+        # Writes everything still queued, then stops the thread
+        self.queue.put(None)
+        self.thread.join()
+
+    def _run(self):
+        # Every error is handled per item: the thread has to keep draining the
+        # queue, otherwise put() and close() block forever once it is full.
+        batch = []
+        while True:
+            try:
+                item = self.queue.get(timeout=config.WRITE_FLUSH_INTERVAL)
+            except queue.Empty:
+                item = False
+            try:
+                if item is False:
+                    self._flush(batch)
+                elif item is None:
+                    self._flush(batch)
+                    break
+                elif isinstance(item, _RestaurantStart):
+                    self._flush(batch)
+                    self.restaurant_key = item.restaurant_key
+                elif isinstance(item, _RestaurantEnd):
+                    self._flush(batch)
+                    self._finish_restaurant(item)
+                else:
+                    batch.append(item)
+                    if len(batch) >= self.batch_size:
+                        self._flush(batch)
+            except Exception as e:
+                print(f"Error in the review writer: {e}")
+                self.failed += len(batch)
+                batch.clear()
+        self._close_connection()
+
+    def _close_connection(self):
+        if self.conn and not self.conn.closed:
+            try:
+                self.conn.close()
+            except Exception:
+                pass
+        self.conn = None
+
+    def _flush(self, batch):
+        if not batch:
+            return
+        try:
+            if self.conn is None or self.conn.closed:
+                self.conn = connect_to_db()
+            if self.conn:
+                with metrics.booked_to(self.restaurant_key):
+                    inserted, skipped = insert_reviews(self.conn, batch, self.batch_size)
+            else:
+                inserted, skipped = 0, 0
+        except Exception as e:
+            print(f"Error writing reviews: {e}")
+            self._close_connection()
+            inserted, skipped = 0, 0
+        self.inserted += inserted
+        self.skipped += skipped
+        self.failed += len(batch) - inserted - skipped
+        batch.clear()
+
+    def _finish_restaurant(self, end):
+        self.restaurant_key = None
+        print(f"{end.restaurant_name}: inserted {self.inserted} reviews, skipped {self.skipped} duplicates")
+        callback = end.on_stored
+        if self.failed:
+            print(f"{end.restaurant_name}: {self.failed} reviews could not be stored")
+            callback = end.on_failed
+        if callback:
+            try:
+                callback()
+            except Exception as e:
+                print(f"{end.restaurant_name}: error after writing reviews: {e}")
+        self.inserted = self.skipped = self.failed = 0
@@ -0,0 +1,70 @@
+import itertools
+import os
+import sys
+from urllib.parse import parse_qs, urlparse
+import pytest
+
+# The scripts are flat modules in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fixture_site import start_site  # noqa: E402
+import review_store  # noqa: E402
+
+_database_names = itertools.count()
+
+
+@pytest.fixture
+def site():
+    server = start_site()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(scope="session")
+def postgres_server(tmp_path_factory):
+    # A server from TALABAT_TEST_DB_HOST / _PORT / _USER / _PASSWORD, or a
+    # throwaway local one when pgserver is installed
+    if os.environ.get("TALABAT_TEST_DB_HOST"):
+        yield {
+            "TALABAT_DB_HOST": os.environ["TALABAT_TEST_DB_HOST"],
+            "TALABAT_DB_PORT": os.environ.get("TALABAT_TEST_DB_PORT", "5432"),
+            "TALABAT_DB_USER": os.environ.get("TALABAT_TEST_DB_USER", "postgres"),
+            "TALABAT_DB_PASSWORD": os.environ.get("TALABAT_TEST_DB_PASSWORD", ""),
+        }
+        return
+    pgserver = pytest.importorskip("pgserver", reason="needs TALABAT_TEST_DB_HOST or pgserver")
+    server = pgserver.get_server(tmp_path_factory.mktemp("postgres"), cleanup_mode="stop")
+    uri = urlparse(server.get_uri())
+    yield {
+        "TALABAT_DB_HOST": parse_qs(uri.query)["host"][0],
+        "TALABAT_DB_PORT": str(uri.port or 5432),
+        "TALABAT_DB_USER": "postgres",
+        "TALABAT_DB_PASSWORD": "",
+    }
+    server.cleanup()
+
+
+@pytest.fixture
+def postgres(postgres_server, monkeypatch):
+    # An empty database per test. review_store connects to it, and so do
+    # subprocesses started with the environment returned here.
+    import psycopg2
+
+    settings = dict(postgres_server, TALABAT_DB_NAME=f"talabat_test_{os.getpid()}_{next(_database_names)}")
+    admin = psycopg2.connect(
+        host=settings["TALABAT_DB_HOST"], port=settings["TALABAT_DB_PORT"], database="postgres",
+        user=settings["TALABAT_DB_USER"], password=settings["TALABAT_DB_PASSWORD"]
+    )
+    admin.autocommit = True
+    with admin.cursor() as cur:
+        cur.execute(f'CREATE DATABASE "{settings["TALABAT_DB_NAME"]}"')
+
+    for name, value in settings.items():
+        monkeypatch.setenv(name, value)
+        monkeypatch.setattr(review_store, name.replace("TALABAT_", ""), value)
+    yield dict(os.environ)
+
+    with admin.cursor() as cur:
+        cur.execute(f'DROP DATABASE IF EXISTS "{settings["TALABAT_DB_NAME"]}" WITH (FORCE)')
+    admin.close()
@@ -0,0 +1,59 @@
+# Local stand-in for the site: serves the recorded pages in tests/fixtures
+# over http.server, for runs with --engine http --base-url.
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import os
+import threading
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+ROUTES = {
+    "/egypt/restaurants/": "listing_1.html",
+    "/egypt/restaurants/?page=1": "listing_1.html",
+    "/egypt/restaurants/?page=2": "listing_2.html",
+    "/egypt/falafel-house": "restaurant_complete.html",
+    "/egypt/koshary-el-tahrir": "restaurant_load_more.html",
+    "/egypt/pizza-corner": "restaurant_embedded.html",
+    "/egypt/koshary-el-tahrir-maadi": "restaurant_complete.html",
+    "/egypt/grill-and-more": "restaurant_embedded.html",
+}
+
+
+def fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), encoding="utf-8") as f:
+        return f.read()
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    # server.routes maps request paths to fixture files; server.bodies and
+    # server.statuses override the page or status for single paths.
+    def do_GET(self):
+        with self.server.lock:
+            self.server.requested.append(self.path)
+        status = self.server.statuses.get(self.path, 200)
+        html = self.server.bodies.get(self.path)
+        name = self.server.routes.get(self.path)
+        if html is None and name is not None:
+            html = fixture(name)
+        if html is None:
+            status = 404
+        body = html.encode("utf-8") if status == 200 else b""
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_site():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FixtureHandler)
+    server.routes = dict(ROUTES)
+    server.statuses = {}
+    server.bodies = {}
+    server.requested = []
+    server.lock = threading.Lock()
+    server.base_url = f"http://127.0.0.1:{server.server_port}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
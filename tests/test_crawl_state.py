@@ -0,0 +1,45 @@
+import sqlite3
+from crawl_state import CrawlState
+
+
+def test_resume_only_returns_vendors_seen_by_the_interrupted_run(tmp_path):
+    path = tmp_path / "crawl_state.sqlite3"
+    state = CrawlState(path)
+    state.start_new_run()
+    state.add_vendor("/egypt/old-branch", "Old Branch")
+    state.add_vendor("/egypt/koshary", "Koshary")
+    state.mark_vendor_done("/egypt/old-branch", "Old Branch", "key-1")
+    state.mark_vendor_done("/egypt/koshary", "Koshary", "key-2")
+
+    # Second run is interrupted after seeing two vendors and storing one
+    state.start_new_run()
+    state.add_vendor("/egypt/koshary", "Koshary")
+    state.add_vendor("/egypt/falafel", "Falafel")
+    state.mark_vendor_done("/egypt/falafel", "Falafel", None)
+    state.close()
+
+    resumed = CrawlState(path)
+    assert resumed.pending_vendors() == [("/egypt/koshary", "Koshary")]
+    assert resumed.newest_review_key("/egypt/old-branch") == "key-1"
+    assert resumed.newest_review_key("/egypt/koshary") == "key-2"
+    resumed.close()
+
+
+def test_state_files_without_run_tracking_are_upgraded(tmp_path):
+    path = tmp_path / "crawl_state.sqlite3"
+    db = sqlite3.connect(path)
+    db.executescript(
+        "CREATE TABLE listing_pages (page INTEGER PRIMARY KEY, done_at TEXT);"
+        "CREATE TABLE vendors (link TEXT PRIMARY KEY, restaurant_name TEXT, done_at TEXT, newest_review_key TEXT);"
+        "INSERT INTO vendors VALUES ('/egypt/koshary', 'Koshary', NULL, 'key-2');"
+    )
+    db.commit()
+    db.close()
+
+    state = CrawlState(path)
+    assert state.pending_vendors() == []
+    assert state.newest_review_key("/egypt/koshary") == "key-2"
+    state.start_new_run()
+    state.add_vendor("/egypt/koshary", "Koshary")
+    assert state.pending_vendors() == [("/egypt/koshary", "Koshary")]
+    state.close()
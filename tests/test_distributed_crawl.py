@@ -0,0 +1,145 @@
+# Several worker processes sharing one local Postgres, crawling the local
+# stand-in for the site with --engine http
+import os
+import subprocess
+import sys
+import time
+import pytest
+
+pytest.importorskip("requests")
+
+from job_queue import JobQueue
+from review_store import connect_to_db
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPT = os.path.join(ROOT, "updated_talabat_script.py")
+
+CREATE_REVIEWS_SQL = """
+CREATE TABLE reviews (
+    id serial PRIMARY KEY,
+    review_text text,
+    rating text,
+    author_name text,
+    review_source text,
+    restaurant_name text
+)
+"""
+
+
+def query(sql):
+    conn = connect_to_db()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(sql)
+            return cur.fetchall()
+    finally:
+        conn.close()
+
+
+def create_reviews_table():
+    conn = connect_to_db()
+    with conn.cursor() as cur:
+        cur.execute(CREATE_REVIEWS_SQL)
+    conn.commit()
+    conn.close()
+
+
+def run_script(env, *args):
+    return subprocess.Popen(
+        [sys.executable, SCRIPT, *args], cwd=ROOT, env=env,
+        stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True
+    )
+
+
+def finish(process, timeout=120):
+    output, _ = process.communicate(timeout=timeout)
+    assert process.returncode == 0, output
+    return output
+
+
+@pytest.mark.parametrize("workers_first", [False, True], ids=["coordinator-first", "workers-first"])
+def test_worker_processes_share_the_crawl(postgres, site, workers_first):
+    create_reviews_table()
+    # Every restaurant page is complete over HTTP, so no browser is needed
+    site.routes["/egypt/koshary-el-tahrir"] = "restaurant_complete.html"
+    options = ["--engine", "http", "--base-url", site.base_url, "--requests-per-second", "50"]
+
+    def start_workers():
+        return [run_script(postgres, "--role", "worker", "--workers", "2", *options) for _ in range(3)]
+
+    if workers_first:
+        # Workers wait for the queue to be seeded instead of stopping at once
+        workers = start_workers()
+        time.sleep(3)
+        finish(run_script(postgres, "--role", "coordinator", "--reset-jobs", *options))
+    else:
+        finish(run_script(postgres, "--role", "coordinator", "--reset-jobs", *options))
+        workers = start_workers()
+    for worker in workers:
+        finish(worker)
+
+    assert query("SELECT kind, status, count(*) FROM crawl_jobs GROUP BY kind, status ORDER BY kind") == [
+        ("listing_page", "done", 2),
+        ("vendor", "done", 5),
+    ]
+    # Both "Koshary El Tahrir" branches serve the same reviews, stored once
+    assert query("SELECT restaurant_name, count(*) FROM reviews GROUP BY restaurant_name ORDER BY 1") == [
+        ("Falafel House", 3),
+        ("Grill & More", 5),
+        ("Koshary El Tahrir", 3),
+        ("Pizza Corner", 5),
+    ]
+    restaurant_requests = [path for path in site.requested if not path.startswith("/egypt/restaurants/")]
+    assert sorted(restaurant_requests) == sorted(set(restaurant_requests))
+    assert len(restaurant_requests) == 5
+    # The starting rate above config.MAX_REQUESTS_PER_SECOND was kept
+    assert query("SELECT host, rate FROM host_rate_limits") == [(site.base_url.split("//")[1], 50.0)]
+
+
+def test_worker_without_jobs_stops_after_the_idle_timeout(postgres, site):
+    create_reviews_table()
+    options = ["--engine", "http", "--base-url", site.base_url]
+    started = time.monotonic()
+    output = finish(run_script(postgres, "--role", "worker", "--workers", "1", "--idle-timeout", "1", *options))
+    assert "No jobs after 1s" in output
+    assert time.monotonic() - started < 60
+
+
+ACQUIRE_FROM_SEVERAL_PROCESSES = """
+import sys
+import time
+from job_queue import JobQueue, PostgresRateLimiter
+
+limiter = PostgresRateLimiter(JobQueue(), rate=5, burst=1)
+time.sleep(max(0.0, float(sys.argv[1]) - time.time()))
+for _ in range(4):
+    limiter.acquire("http://talabat.test/egypt/restaurants/")
+    print("acquired", time.time(), flush=True)
+"""
+
+
+def test_request_budget_is_shared_between_processes(postgres):
+    jobs = JobQueue()
+    jobs.create_tables()
+    jobs.close()
+    start_at = str(time.time() + 2)
+    processes = [
+        subprocess.Popen(
+            [sys.executable, "-c", ACQUIRE_FROM_SEVERAL_PROCESSES, start_at], cwd=ROOT, env=postgres,
+            stdout=subprocess.PIPE, text=True
+        )
+        for _ in range(3)
+    ]
+    times = []
+    for process in processes:
+        output, _ = process.communicate(timeout=60)
+        assert process.returncode == 0
+        times.extend(float(line.split()[1]) for line in output.splitlines() if line.startswith("acquired"))
+    times.sort()
+
+    # However the processes interleave, no window holds more requests than the
+    # burst plus the rate times its length (one request of slack for timing)
+    assert len(times) == 12
+    for first in range(len(times)):
+        for last in range(first + 1, len(times)):
+            assert last - first + 1 <= 1 + 5 * (times[last] - times[first]) + 1
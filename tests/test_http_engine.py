@@ -0,0 +1,132 @@
+# Runs the --engine http paths against the local stand-in for the site
+import pytest
+from selenium.common.exceptions import TimeoutException
+
+pytest.importorskip("requests")
+
+import config
+import updated_talabat_script
+
+from fixture_site import fixture
+from pacing import HostRateLimiter
+from review_store import review_key
+from updated_talabat_script import Fetcher, get_total_number_of_pages, get_vendor_cards
+
+
+class UsedBrowser(Exception):
+    pass
+
+
+@pytest.fixture
+def fetcher(site):
+    # --engine http --base-url http://127.0.0.1:<port>. Pages that need a
+    # browser are recorded, and rendered from browser_pages when one is given.
+    fetcher = Fetcher("http", site.base_url, HostRateLimiter(rate=1000, burst=1000))
+    fetcher.browser_urls = []
+    fetcher.browser_pages = {}
+
+    def browser_get(url):
+        fetcher.browser_urls.append(url)
+        if url not in fetcher.browser_pages:
+            raise UsedBrowser(url)
+        return type("Driver", (), {"page_source": fixture(fetcher.browser_pages[url])})()
+
+    fetcher.browser_get = browser_get
+    yield fetcher
+    fetcher.close()
+
+
+def host_rate(fetcher, site):
+    tokens, rate, _ = fetcher.limiter.buckets[site.base_url.split("//")[1]]
+    return rate
+
+
+def read_reviews(fetcher, link, restaurant_name, known_review_key=None):
+    reviews = []
+    scan = fetcher.restaurant_reviews(link, restaurant_name, known_review_key)
+    while True:
+        try:
+            reviews.append(next(scan))
+        except StopIteration as finished:
+            return [review.review_text for review in reviews], finished.value
+
+
+def test_listing_pages(fetcher):
+    assert get_total_number_of_pages(fetcher) == 2
+    assert get_vendor_cards(fetcher, 2) == [
+        ("/egypt/koshary-el-tahrir-maadi", "Koshary El Tahrir"),
+        ("/egypt/grill-and-more", "Grill & More"),
+    ]
+    assert fetcher.browser_urls == []
+
+
+def test_listing_without_vendor_markup_is_rendered_in_the_browser(fetcher, site):
+    site.routes["/egypt/restaurants/?page=1"] = "challenge.html"
+    url = f"{fetcher.base_url}/egypt/restaurants/?page=1"
+    fetcher.browser_pages[url] = "listing_1.html"
+    assert len(get_vendor_cards(fetcher, 1)) == 3
+    assert fetcher.browser_urls == [url]
+    # A 200 page without the expected markup may be a bot challenge
+    assert host_rate(fetcher, site) < 1000
+
+
+def test_listing_error_status_is_rendered_in_the_browser(fetcher, site):
+    site.statuses["/egypt/restaurants/"] = 429
+    url = f"{fetcher.base_url}/egypt/restaurants/"
+    fetcher.browser_pages[url] = "listing_1.html"
+    assert get_total_number_of_pages(fetcher) == 2
+    assert fetcher.browser_urls == [url]
+    # The rate limit response went to the limiter, not to client-side retries
+    assert site.requested == ["/egypt/restaurants/"]
+    assert host_rate(fetcher, site) < 1000
+
+
+def test_complete_restaurant_page(fetcher):
+    reviews, complete = read_reviews(fetcher, "/egypt/falafel-house", "Falafel House")
+    assert reviews == ["Falafel review 0", "Falafel review 1", "Falafel review 2"]
+    assert complete is True
+    assert fetcher.browser_urls == []
+
+
+def test_early_stop_at_the_known_review(fetcher):
+    known = review_key("Koshary review 2", "Customer 2", "Koshary El Tahrir")
+    reviews, complete = read_reviews(fetcher, "/egypt/koshary-el-tahrir", "Koshary El Tahrir", known)
+    assert reviews == ["Koshary review 0", "Koshary review 1"]
+    assert complete is True
+    assert fetcher.browser_urls == []
+
+
+def test_reviews_behind_load_more_need_the_browser(fetcher, site):
+    with pytest.raises(UsedBrowser):
+        read_reviews(fetcher, "/egypt/koshary-el-tahrir", "Koshary El Tahrir")
+    assert fetcher.browser_urls == [f"{fetcher.base_url}/egypt/koshary-el-tahrir"]
+    # The page itself was fine, so the host is not slowed down
+    assert host_rate(fetcher, site) == 1000
+
+
+def test_first_review_timeout_backs_off(fetcher, site, monkeypatch):
+    def time_out(driver):
+        raise TimeoutException("no reviews")
+
+    monkeypatch.setattr(updated_talabat_script, "wait_for_first_review", time_out)
+    fetcher.browser_pages[f"{fetcher.base_url}/egypt/koshary-el-tahrir"] = "challenge.html"
+    with pytest.raises(TimeoutException):
+        read_reviews(fetcher, "/egypt/koshary-el-tahrir", "Koshary El Tahrir")
+    # Only the browser page backed off: the HTTP page just had a load-more button
+    assert host_rate(fetcher, site) == 1000 * config.RATE_BACKOFF_FACTOR
+
+
+def test_reviews_from_embedded_page_state(fetcher):
+    reviews, complete = read_reviews(fetcher, "/egypt/pizza-corner", "Pizza Corner")
+    assert reviews == [f"Pizza review {i}" for i in range(5)]
+    assert complete is True
+    assert fetcher.browser_urls == []
+
+
+def test_partial_embedded_page_state_needs_the_browser(fetcher, site):
+    # Same page with a review count larger than the embedded list
+    site.bodies["/egypt/pizza-corner"] = fixture("restaurant_embedded.html").replace(
+        '"totalReviews": 5', '"totalReviews": 40'
+    )
+    with pytest.raises(UsedBrowser):
+        read_reviews(fetcher, "/egypt/pizza-corner", "Pizza Corner")
@@ -0,0 +1,71 @@
+import pytest
+import config
+import job_queue
+import updated_talabat_script
+from job_queue import VENDOR, JobQueue, PostgresRateLimiter
+
+
+@pytest.fixture
+def jobs(postgres):
+    jobs = JobQueue()
+    jobs.create_tables()
+    yield jobs
+    jobs.close()
+
+
+def terminate_backends(jobs):
+    # What a server restart or a dropped network link looks like to the client
+    other = JobQueue()
+    other.execute(
+        "SELECT pg_terminate_backend(pid) FROM pg_stat_activity "
+        "WHERE datname = current_database() AND pid <> pg_backend_pid()",
+        fetch=True
+    )
+    other.close()
+
+
+def test_claim_reconnects_after_the_connection_is_lost(jobs):
+    jobs.add_jobs(VENDOR, [("/egypt/koshary", "Koshary"), ("/egypt/falafel", "Falafel")])
+    first = jobs.claim()
+    terminate_backends(jobs)
+
+    second = jobs.claim()
+    assert {first.target, second.target} == {"/egypt/koshary", "/egypt/falafel"}
+    jobs.complete(first.id)
+    jobs.complete(second.id)
+    assert jobs.progress() == {"done": 2}
+
+
+def test_add_jobs_reconnects_after_the_connection_is_lost(jobs):
+    terminate_backends(jobs)
+    assert jobs.add_jobs(VENDOR, [("/egypt/koshary", "Koshary")]) == 1
+
+
+def test_crashed_queue_workers_are_restarted(monkeypatch):
+    calls = []
+
+    def queue_worker(worker_id, options, limiter, jobs, state):
+        calls.append(worker_id)
+        if len(calls) < 3:
+            raise job_queue.psycopg2.OperationalError("server closed the connection unexpectedly")
+
+    monkeypatch.setattr(updated_talabat_script, "queue_worker", queue_worker)
+    monkeypatch.setattr(config, "JOB_POLL_INTERVAL", 0)
+    updated_talabat_script.supervise_queue_worker(7, None, None, None, None)
+    assert calls == [7, 7, 7]
+
+
+def test_shared_starting_rate_above_the_cap_survives_healthy_responses(jobs):
+    limiter = PostgresRateLimiter(jobs, rate=50)
+    limiter.acquire("https://www.talabat.com/egypt/restaurants/")
+    limiter.report_success("https://www.talabat.com/egypt/restaurants/")
+    assert jobs.execute("SELECT rate FROM host_rate_limits", fetch=True) == [(50.0,)]
+
+
+def test_rate_limiter_recreates_its_bucket_after_a_reset(jobs):
+    limiter = PostgresRateLimiter(jobs, rate=50)
+    limiter.acquire("https://www.talabat.com/egypt/restaurants/")
+    jobs.reset()  # coordinator --reset-jobs while this worker keeps running
+    limiter.acquire("https://www.talabat.com/egypt/restaurants/")
+    limiter.report_success("https://www.talabat.com/egypt/restaurants/")
+    assert jobs.execute("SELECT host, rate FROM host_rate_limits", fetch=True) == [("www.talabat.com", 50.0)]
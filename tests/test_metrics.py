@@ -0,0 +1,91 @@
+import time
+import pytest
+import metrics
+import updated_talabat_script
+from review_scraper import REVIEW_XPATH
+from updated_talabat_script import Fetcher
+
+
+@pytest.fixture
+def run_metrics(monkeypatch):
+    collector = metrics.Metrics()
+    monkeypatch.setattr(metrics, "_active", collector)
+    return collector
+
+
+class SlowLimiter:
+    def acquire(self, url):
+        time.sleep(0.3)
+
+    def report_success(self, url):
+        pass
+
+    def report_error(self, url):
+        pass
+
+
+class FakeDriver:
+    def get(self, url):
+        pass
+
+
+def test_time_to_first_review_only_covers_the_page(run_metrics, monkeypatch, tmp_path):
+    def slow_browser_start(lean):
+        time.sleep(0.3)
+        return FakeDriver()
+
+    def iter_reviews(driver, restaurant_name, limiter, known_review_key=None, wait_for_first=True):
+        return True
+        yield
+
+    monkeypatch.setattr(updated_talabat_script, "create_driver", slow_browser_start)
+    monkeypatch.setattr(updated_talabat_script, "wait_for_first_review", lambda driver: time.sleep(0.05))
+    monkeypatch.setattr(updated_talabat_script, "iter_reviews", iter_reviews)
+    monkeypatch.setattr(updated_talabat_script, "transferred_bytes", lambda driver: 2048)
+
+    fetcher = Fetcher("selenium", "https://www.talabat.com", SlowLimiter())
+    assert list(fetcher.restaurant_reviews("/egypt/koshary", "Koshary")) == []
+
+    observations = run_metrics.summary()["observations"]
+    assert 0.05 <= observations["time_to_first_review_seconds"]["mean"] < 0.3
+    assert observations["browser_bytes_downloaded"] == {"total": 2048, "count": 1, "mean": 2048}
+
+    path = tmp_path / "talabat.prom"
+    run_metrics.write_prometheus(str(path))
+    assert 'talabat_observation_sum{name="browser_bytes_downloaded"} 2048.000000' in path.read_text()
+
+
+class OneReviewDriver(FakeDriver):
+    # A rendered restaurant page with a single review and no load-more button
+    current_url = "https://www.talabat.com/egypt/koshary"
+    review = ["Koshary review", "5", "Customer"]
+
+    def find_element(self, by, xpath):
+        return self.review
+
+    def find_elements(self, by, xpath):
+        return [self.review] if xpath == REVIEW_XPATH else []
+
+    def execute_script(self, script, start):
+        return [self.review][start:]
+
+
+def test_first_review_wait_is_counted_once(run_metrics, monkeypatch):
+    monkeypatch.setattr(updated_talabat_script, "create_driver", lambda lean: OneReviewDriver())
+    monkeypatch.setattr(updated_talabat_script, "transferred_bytes", lambda driver: 0)
+
+    fetcher = Fetcher("selenium", "https://www.talabat.com", SlowLimiter())
+    assert [review.review_text for review in fetcher.restaurant_reviews("/egypt/koshary", "Koshary")] == ["Koshary review"]
+    assert run_metrics.stage_calls["wait_first_review"] == 1
+
+
+def test_chain_branches_are_kept_apart(run_metrics):
+    for link in ("/egypt/koshary-el-tahrir", "/egypt/koshary-el-tahrir-maadi"):
+        with metrics.restaurant(link, "Koshary El Tahrir"):
+            with metrics.stage("parse"):
+                pass
+    restaurants = run_metrics.summary()["restaurants"]
+    assert set(restaurants) == {"/egypt/koshary-el-tahrir", "/egypt/koshary-el-tahrir-maadi"}
+    for restaurant in restaurants.values():
+        assert restaurant["name"] == "Koshary El Tahrir"
+        assert set(restaurant["stages"]) == {"parse", "restaurant"}
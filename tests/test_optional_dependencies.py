@@ -0,0 +1,36 @@
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Imports the scripts in a fresh interpreter where the optional packages
+# cannot be found, as in a venv installed from requirements.txt only. A None
+# entry in sys.modules makes imports fail and importlib.util.find_spec()
+# return None.
+WITHOUT_OPTIONAL_PACKAGES = """
+import sys
+
+for name in ("requests", "lxml", "psutil"):
+    sys.modules[name] = None
+
+import benchmark_parsers
+import page_parser
+import updated_talabat_script
+from pacing import HostRateLimiter
+
+assert page_parser.DEFAULT_BACKEND == "html.parser"
+assert benchmark_parsers.BACKENDS == ["html.parser"]
+fetcher = updated_talabat_script.Fetcher("selenium", "http://localhost", HostRateLimiter())
+assert fetcher.session is None
+print("ok")
+"""
+
+
+def test_scripts_import_without_optional_packages():
+    result = subprocess.run(
+        [sys.executable, "-c", WITHOUT_OPTIONAL_PACKAGES],
+        cwd=ROOT, capture_output=True, text=True, timeout=60
+    )
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip().endswith("ok")
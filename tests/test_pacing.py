@@ -0,0 +1,25 @@
+import config
+from pacing import HostRateLimiter
+
+URL = "https://www.talabat.com/egypt/restaurants/"
+
+
+def rate(limiter):
+    return limiter.buckets["www.talabat.com"][1]
+
+
+def test_starting_rate_above_the_cap_survives_healthy_responses():
+    limiter = HostRateLimiter(rate=50)
+    limiter.acquire(URL)
+    limiter.report_success(URL)
+    assert rate(limiter) == 50
+
+
+def test_rate_speeds_up_to_the_cap_and_backs_off():
+    limiter = HostRateLimiter(rate=1.99, max_rate=2.0)
+    limiter.acquire(URL)
+    for _ in range(5):
+        limiter.report_success(URL)
+    assert rate(limiter) == 2.0
+    limiter.report_error(URL)
+    assert rate(limiter) == 2.0 * config.RATE_BACKOFF_FACTOR
@@ -0,0 +1,47 @@
+import pytest
+import benchmark_parsers
+from fixture_site import fixture
+from page_parser import (
+    NeedsBrowser, parse_embedded_reviews, parse_review_page, parse_total_number_of_pages, parse_vendor_cards
+)
+
+CHALLENGE_PAGE = """
+<html><head><title>Just a moment...</title></head>
+<body><div id="challenge-running">Checking your browser before accessing talabat.com</div></body></html>
+"""
+
+
+@pytest.mark.parametrize("parse", [parse_total_number_of_pages, parse_vendor_cards])
+def test_listing_without_expected_markup_needs_browser(parse):
+    with pytest.raises(NeedsBrowser):
+        parse(CHALLENGE_PAGE)
+
+
+PAGES = [
+    (name, html, parse)
+    for pattern, parse in benchmark_parsers.PAGE_KINDS.values()
+    for name, html in benchmark_parsers.load_fixtures(benchmark_parsers.FIXTURES_DIR, pattern)
+]
+
+
+def test_fixtures_cover_every_page_kind():
+    assert {parse for _, _, parse in PAGES} == {kind[1] for kind in benchmark_parsers.PAGE_KINDS.values()}
+
+
+@pytest.mark.parametrize("backend", benchmark_parsers.BACKENDS)
+@pytest.mark.parametrize("targeted", [False, True])
+@pytest.mark.parametrize("name, html, parse", PAGES, ids=[name for name, _, _ in PAGES])
+def test_output_matches_the_full_page_html_parser(name, html, parse, backend, targeted):
+    assert parse(html, backend, targeted) == parse(html, *benchmark_parsers.REFERENCE)
+
+
+def test_reference_output():
+    listing = fixture("listing_1.html")
+    assert parse_total_number_of_pages(listing) == 2
+    assert parse_vendor_cards(listing)[0] == ("/egypt/koshary-el-tahrir", "Koshary El Tahrir")
+    fields, has_more = parse_review_page(fixture("restaurant_load_more.html"))
+    assert fields[0] == ("Koshary review 0", "5.0", "Customer 0")
+    assert len(fields) == 4 and has_more
+    fields, has_more = parse_review_page(fixture("restaurant_complete.html"))
+    assert len(fields) == 3 and not has_more
+    assert parse_embedded_reviews(fixture("restaurant_embedded.html"))[1] == 5
@@ -0,0 +1,154 @@
+import pytest
+from selenium.common.exceptions import NoSuchElementException
+import config
+import review_scraper
+from pacing import HostRateLimiter
+from review_scraper import LOAD_MORE_XPATH, REVIEW_XPATH, iter_reviews
+from review_store import review_key
+from updated_talabat_script import scrape_restaurant
+
+RESTAURANT = "Koshary El Tahrir"
+
+
+class FakeButton:
+    def __init__(self, driver):
+        self.driver = driver
+
+    def is_displayed(self):
+        return True
+
+    def is_enabled(self):
+        return True
+
+    def click(self):
+        if not self.driver.stuck:
+            self.driver.loaded = min(self.driver.loaded + self.driver.page_size, len(self.driver.reviews))
+
+
+class FakeDriver:
+    # A restaurant page showing page_size reviews per load-more click. A stuck
+    # page keeps its button but never loads anything more.
+    current_url = "https://www.talabat.com/egypt/koshary-el-tahrir"
+
+    def __init__(self, review_count, page_size=3, stuck=False):
+        self.reviews = [[f"review {i}", "5", f"author {i}"] for i in range(review_count)]
+        self.page_size = page_size
+        self.loaded = min(page_size, review_count)
+        self.stuck = stuck
+
+    def execute_script(self, script, start):
+        return self.reviews[start:self.loaded]
+
+    def find_elements(self, by, xpath):
+        if xpath == REVIEW_XPATH:
+            return self.reviews[:self.loaded]
+        if xpath == LOAD_MORE_XPATH and self.loaded < len(self.reviews):
+            return [FakeButton(self)]
+        return []
+
+    def find_element(self, by, xpath):
+        elements = self.find_elements(by, xpath)
+        if not elements:
+            raise NoSuchElementException(xpath)
+        return elements[0]
+
+
+@pytest.fixture(autouse=True)
+def short_timeouts(monkeypatch):
+    monkeypatch.setattr(config, "LOAD_MORE_BUTTON_TIMEOUT", 0.2)
+    monkeypatch.setattr(config, "LOAD_MORE_RESULT_TIMEOUT", 0.3)
+
+
+def read_all(driver, known_review_key=None):
+    reviews = []
+    scan = iter_reviews(driver, RESTAURANT, HostRateLimiter(rate=1000, burst=1000), known_review_key)
+    while True:
+        try:
+            reviews.append(next(scan))
+        except StopIteration as finished:
+            return reviews, finished.value
+
+
+def test_complete_when_the_button_is_gone():
+    reviews, complete = read_all(FakeDriver(8))
+    assert [review.review_text for review in reviews] == [f"review {i}" for i in range(8)]
+    assert complete is True
+
+
+class CountingLimiter(HostRateLimiter):
+    def __init__(self):
+        super().__init__(rate=1000, burst=1000)
+        self.acquired = 0
+
+    def acquire(self, url):
+        self.acquired += 1
+        super().acquire(url)
+
+
+@pytest.mark.parametrize("review_count, clicks", [(2, 0), (3, 0), (8, 2)])
+def test_no_request_once_the_button_is_gone(review_count, clicks):
+    limiter = CountingLimiter()
+    scan = iter_reviews(FakeDriver(review_count), RESTAURANT, limiter)
+    assert len(list(scan)) == review_count
+    assert limiter.acquired == clicks
+
+
+def test_complete_when_the_known_review_is_reached():
+    reviews, complete = read_all(FakeDriver(8), review_key("review 4", "author 4", RESTAURANT))
+    assert [review.review_text for review in reviews] == [f"review {i}" for i in range(4)]
+    assert complete is True
+
+
+def test_incomplete_when_load_more_times_out():
+    reviews, complete = read_all(FakeDriver(8, stuck=True), review_key("review 6", "author 6", RESTAURANT))
+    assert len(reviews) == 3
+    assert complete is False
+
+
+def test_incomplete_when_the_button_is_not_clickable(monkeypatch):
+    monkeypatch.setattr(review_scraper, "click_read_more", lambda driver: False)
+    reviews, complete = read_all(FakeDriver(8))
+    assert len(reviews) == 3
+    assert complete is False
+
+
+class FakeFetcher:
+    def __init__(self, complete):
+        self.complete = complete
+
+    def restaurant_reviews(self, restaurant_page_link, restaurant_name, known_review_key=None):
+        reviews, _ = read_all(FakeDriver(2), known_review_key)
+        yield from reviews
+        return self.complete
+
+
+class FakeWriter:
+    def start_restaurant(self, restaurant_key):
+        pass
+
+    def put(self, review):
+        pass
+
+    def end_restaurant(self, restaurant_name, on_stored=None, on_failed=None):
+        on_stored()
+
+
+class FakeState:
+    def __init__(self):
+        self.marked = []
+
+    def newest_review_key(self, link):
+        return None
+
+    def mark_vendor_done(self, link, restaurant_name, newest_review_key):
+        self.marked.append(newest_review_key)
+
+
+@pytest.mark.parametrize("complete, marker", [
+    (True, review_key("review 0", "author 0", RESTAURANT)),
+    (False, None),
+])
+def test_marker_only_advances_after_a_complete_scan(complete, marker):
+    state = FakeState()
+    scrape_restaurant(FakeFetcher(complete), FakeWriter(), state, "/egypt/koshary-el-tahrir", RESTAURANT)
+    assert state.marked == [marker]
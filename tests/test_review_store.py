@@ -0,0 +1,74 @@
+import pytest
+import psycopg2
+from review_store import Review, connect_to_db, ensure_review_key, insert_reviews
+
+CREATE_REVIEWS_SQL = """
+CREATE TABLE reviews (
+    id serial PRIMARY KEY,
+    review_text text,
+    rating text,
+    author_name text,
+    review_source text,
+    restaurant_name text
+)
+"""
+
+
+@pytest.fixture
+def conn(postgres):
+    conn = connect_to_db()
+    with conn.cursor() as cur:
+        cur.execute(CREATE_REVIEWS_SQL)
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+def fetch(conn, sql):
+    with conn.cursor() as cur:
+        cur.execute(sql)
+        rows = cur.fetchall()
+    conn.commit()
+    return rows
+
+
+def test_duplicates_are_removed_before_the_unique_index(conn):
+    with conn.cursor() as cur:
+        cur.executemany(
+            "INSERT INTO reviews (review_text, rating, author_name, review_source, restaurant_name) "
+            "VALUES (%s, %s, %s, 'Talabat', %s)",
+            [
+                ("Great koshary", "5.0", "Mona", "Koshary El Tahrir"),
+                ("Great koshary", "5.0", "Mona", "Koshary El Tahrir"),
+                ("Great koshary", "4.0", "Mona", "Koshary El Tahrir"),
+                ("Great koshary", "5.0", "Omar", "Koshary El Tahrir"),
+            ]
+        )
+    conn.commit()
+
+    ensure_review_key(conn)
+
+    assert fetch(conn, "SELECT id, author_name FROM reviews ORDER BY id") == [(1, "Mona"), (4, "Omar")]
+    inserted, skipped = insert_reviews(conn, [
+        Review("Great koshary", "5.0", "Mona", "Koshary El Tahrir"),
+        Review("Cold falafel", "2.0", "Mona", "Koshary El Tahrir"),
+    ])
+    assert (inserted, skipped) == (1, 1)
+
+
+def test_no_schema_change_once_the_key_exists(conn, postgres):
+    ensure_review_key(conn)
+
+    # A writer in the middle of a transaction holds a lock ALTER TABLE would wait for
+    writer = connect_to_db()
+    with writer.cursor() as cur:
+        cur.execute("INSERT INTO reviews (review_text, author_name, restaurant_name) VALUES ('x', 'y', 'z')")
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SET lock_timeout = '1s'")
+        ensure_review_key(conn)
+    except psycopg2.errors.LockNotAvailable:
+        pytest.fail("ensure_review_key changed the schema although review_key already exists")
+    finally:
+        writer.rollback()
+        writer.close()
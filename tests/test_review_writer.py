@@ -0,0 +1,140 @@
+import threading
+import psycopg2
+import pytest
+import metrics
+import review_store
+from review_store import Review, ReviewWriter
+
+
+class StubConnection:
+    # Accepts inserts until drop_after batches, then behaves like a connection
+    # whose server went away: the insert raises and closed becomes non-zero.
+    def __init__(self, drop_after=None):
+        self.drop_after = drop_after
+        self.batches = []
+        self.closed = 0
+
+    def cursor(self):
+        return StubCursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        if self.closed:
+            raise psycopg2.InterfaceError("connection already closed")
+
+    def close(self):
+        self.closed = 1
+
+
+class StubCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+def stub_execute_values(cur, sql, rows, page_size=None, fetch=False):
+    conn = cur.conn
+    if conn.closed:
+        raise psycopg2.InterfaceError("connection already closed")
+    if conn.drop_after is not None and len(conn.batches) >= conn.drop_after:
+        conn.closed = 2
+        raise psycopg2.OperationalError("server closed the connection unexpectedly")
+    conn.batches.append(rows)
+    return [(1,)] * len(rows)
+
+
+@pytest.fixture
+def connections(monkeypatch):
+    # The first connection drops after one batch, every reconnect works
+    opened = []
+
+    def connect():
+        conn = StubConnection(drop_after=1 if not opened else None)
+        opened.append(conn)
+        return conn
+
+    monkeypatch.setattr(review_store, "connect_to_db", connect)
+    monkeypatch.setattr(review_store, "execute_values", stub_execute_values)
+    return opened
+
+
+def reviews(restaurant, count):
+    return [Review(f"review {i}", "5", f"author {i}", restaurant) for i in range(count)]
+
+
+def run_with_timeout(target, timeout=10):
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), "writer blocked"
+
+
+def test_insert_reviews_counts_failed_batch_on_dropped_connection(connections):
+    conn = review_store.connect_to_db()
+    inserted, skipped = review_store.insert_reviews(conn, reviews("Koshary", 4), batch_size=2)
+    assert (inserted, skipped) == (2, 0)
+    assert conn.closed
+
+
+def test_writer_survives_dropped_connection(connections):
+    writer = ReviewWriter(queue_size=3, batch_size=2).start()
+    outcome = {}
+
+    def crawl():
+        for restaurant in ("Koshary", "Falafel"):
+            for review in reviews(restaurant, 6):
+                writer.put(review)
+            writer.end_restaurant(
+                restaurant,
+                on_stored=lambda restaurant=restaurant: outcome.setdefault(restaurant, "stored"),
+                on_failed=lambda restaurant=restaurant: outcome.setdefault(restaurant, "failed"),
+            )
+        writer.close()
+
+    run_with_timeout(crawl)
+    assert outcome == {"Koshary": "failed", "Falafel": "stored"}
+    assert len(connections) == 2
+    # One batch stored before the drop, one lost with it, the rest after reconnecting
+    assert [len(conn.batches) for conn in connections] == [1, 4]
+
+
+def test_writer_keeps_running_when_a_callback_or_connect_fails(connections, monkeypatch):
+    monkeypatch.setattr(review_store, "connect_to_db", lambda: None)
+    writer = ReviewWriter(queue_size=2, batch_size=2).start()
+    failed = []
+
+    def crawl():
+        for review in reviews("Koshary", 5):
+            writer.put(review)
+        writer.end_restaurant("Koshary", on_failed=lambda: failed.append(True))
+        writer.close()
+
+    run_with_timeout(crawl)
+    assert failed == [True]
+
+
+def test_writes_are_booked_to_the_restaurant_link(connections, monkeypatch):
+    collector = metrics.Metrics()
+    monkeypatch.setattr(metrics, "_active", collector)
+    connections.append(StubConnection())  # the next connection does not drop
+    writer = ReviewWriter(batch_size=2).start()
+
+    def crawl():
+        for link in ("/egypt/koshary-el-tahrir", "/egypt/koshary-el-tahrir-maadi"):
+            writer.start_restaurant(link)
+            for review in reviews(f"Koshary El Tahrir {link}", 3):
+                writer.put(review)
+            writer.end_restaurant("Koshary El Tahrir")
+        writer.close()
+
+    run_with_timeout(crawl)
+    restaurants = collector.summary()["restaurants"]
+    assert set(restaurants) == {"/egypt/koshary-el-tahrir", "/egypt/koshary-el-tahrir-maadi"}
+    assert all("db_write" in restaurant["stages"] for restaurant in restaurants.values())
@@ -1,152 +1,495 @@
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.chrome.options import Options
-from bs4 import BeautifulSoup
-import psycopg2
+from browser import create_driver, driver_memory_mb, transferred_bytes
+from crawl_state import CrawlState
+from job_queue import LISTING_PAGE, VENDOR, JobQueue, PostgresCrawlState, PostgresRateLimiter
+from pacing import HostRateLimiter
+from page_parser import NeedsBrowser, parse_total_number_of_pages, parse_vendor_cards
+from review_scraper import iter_reviews, wait_for_first_review
+from review_store import ReviewWriter, connect_to_db, ensure_review_key
+from selenium.common.exceptions import TimeoutException
+import argparse
+import config
+import importlib.util
+import metrics
+import queue
+import threading
 import time
 import logging
-import random
 
-DB_HOST = "localhost"
-DB_NAME = "talabat_reviews"
-DB_USER = "postgres"
-DB_PASSWORD = "123456"
+BASE_URL = "https://www.talabat.com"
+LISTING_PATH = "/egypt/restaurants/"
 
-service = Service(executable_path='/usr/bin/chromedriver')
-chrome_options = Options()
-chrome_options.binary_location = '/usr/bin/chromium-browser'
-chrome_options.add_argument("--disable-gpu")
-chrome_options.add_argument("--no-sandbox")
+DEFAULT_WORKERS = 4
 
-def connect_to_db():
+
+class Fetcher:
+    # Fetches pages with the engine chosen for the run. The "http" engine uses a
+    # pooled requests session and only starts a browser when a page needs one.
+    # The browser is reused across restaurants and restarted after
+    # DRIVER_MAX_PAGES page loads or once it grows past DRIVER_MAX_MEMORY_MB.
+    def __init__(self, engine, base_url, limiter, lean=False):
+        self.engine = engine
+        self.base_url = base_url
+        self.limiter = limiter
+        self.lean = lean
+        self.http = self.session = None
+        if engine == "http":
+            # requests is an optional dependency, only needed by this engine
+            import http_fetch
+            self.http = http_fetch
+            self.session = http_fetch.create_session()
+        self.driver = None
+        self.driver_pages = 0
+        self.page_requested_at = None
+
+    def get_driver(self):
+        if self.driver is not None and self.driver_needs_restart():
+            metrics.count("driver_restarts")
+            self.recycle_driver()
+        if self.driver is None:
+            with metrics.stage("driver_start"):
+                self.driver = create_driver(self.lean)
+            self.driver_pages = 0
+        return self.driver
+
+    def driver_needs_restart(self):
+        if self.driver_pages >= config.DRIVER_MAX_PAGES:
+            print(f"Restarting the browser after {self.driver_pages} pages")
+            return True
+        memory_mb = driver_memory_mb(self.driver)
+        if memory_mb is not None and memory_mb > config.DRIVER_MAX_MEMORY_MB:
+            print(f"Restarting the browser at {memory_mb:.0f} MB")
+            return True
+        return False
+
+    def recycle_driver(self):
+        if self.driver:
+            try:
+                self.driver.quit()
+            except Exception:
+                pass
+        self.driver = None
+
+    # http_html() and browser_get() only report failed requests to the rate
+    # limiter. Success is reported by the callers once the page turned out to
+    # hold what was expected: a 200 bot challenge must not speed the host up.
+    def http_html(self, url):
+        self.limiter.acquire(url)
+        try:
+            with metrics.stage("http_fetch"):
+                return self.http.fetch_html(self.session, url)
+        except Exception:
+            self.limiter.report_error(url)
+            raise
+
+    def http_needs_browser(self, url, error):
+        if error.markup_missing:
+            self.limiter.report_error(url)
+        else:
+            self.limiter.report_success(url)
+        print(f"{url}: {error}, falling back to the browser")
+        metrics.count("browser_fallbacks")
+
+    def browser_get(self, url):
+        driver = self.get_driver()
+        self.limiter.acquire(url)
+        self.driver_pages += 1
+        # Taken after the browser start and the rate limit wait, so it only
+        # covers the page itself
+        self.page_requested_at = time.perf_counter()
+        try:
+            with metrics.stage("page_load"):
+                driver.get(url)
+        except Exception:
+            self.limiter.report_error(url)
+            raise
+        return driver
+
+    def listing_page(self, path, parse):
+        # Returns parse(html) for a listing page. An HTTP response without the
+        # expected markup (a bot challenge, a client-rendered listing) makes
+        # parse raise NeedsBrowser, and the page is rendered in the browser.
+        url = f'{self.base_url}{path}'
+        if self.session:
+            try:
+                html = self.http_html(url)
+                with metrics.stage("parse"):
+                    result = parse(html)
+            except NeedsBrowser as e:
+                self.http_needs_browser(url, e)
+            except Exception as e:
+                print(f"HTTP fetch of {url} failed, falling back to the browser: {e}")
+                metrics.count("browser_fallbacks")
+            else:
+                self.limiter.report_success(url)
+                return result
+        driver = self.browser_get(url)
+        with metrics.stage("page_source"):
+            html = driver.page_source
+        try:
+            with metrics.stage("parse"):
+                result = parse(html)
+        except NeedsBrowser:
+            self.limiter.report_error(url)
+            raise
+        self.limiter.report_success(url)
+        return result
+
+    def restaurant_reviews(self, restaurant_page_link, restaurant_name, known_review_key=None):
+        # Yields Review records as soon as each load-more round is read, and
+        # returns whether all of them were read (see iter_reviews)
+        url = f'{self.base_url}{restaurant_page_link}'
+        if self.session:
+            try:
+                reviews = self.http.restaurant_reviews_from_html(self.http_html(url), restaurant_name, known_review_key)
+            except NeedsBrowser as e:
+                self.http_needs_browser(url, e)
+            except Exception as e:
+                print(f"HTTP fetch of {url} failed, falling back to the browser: {e}")
+                metrics.count("browser_fallbacks")
+            else:
+                self.limiter.report_success(url)
+                yield from reviews
+                return True
+        driver = self.browser_get(url)
+        try:
+            wait_for_first_review(driver)
+        except TimeoutException:
+            # No reviews rendered: a rate limit or challenge page looks the same
+            self.limiter.report_error(url)
+            raise
+        self.limiter.report_success(url)
+        time_to_first_review = time.perf_counter() - self.page_requested_at
+        metrics.observe("time_to_first_review_seconds", time_to_first_review)
+        complete = yield from iter_reviews(driver, restaurant_name, self.limiter, known_review_key, wait_for_first=False)
+        downloaded = transferred_bytes(driver)
+        metrics.observe("browser_bytes_downloaded", downloaded)
+        print(f"{restaurant_name}: first review after {time_to_first_review:.2f}s, {downloaded / 1024:.0f} KiB downloaded")
+        return complete
+
+    def close(self):
+        self.recycle_driver()
+        if self.session:
+            self.session.close()
+
+
+def get_total_number_of_pages(fetcher):
+    return fetcher.listing_page(LISTING_PATH, parse_total_number_of_pages)
+
+
+def get_vendor_cards(fetcher, page):
+    return fetcher.listing_page(f'{LISTING_PATH}?page={page}', parse_vendor_cards)
+
+
+def scrape_restaurant(fetcher, writer, state, restaurant_page_link, restaurant_name, on_stored=None, on_failed=None):
+    # Reviews stream to the writer while the page is still being expanded. The
+    # vendor is marked done, and on_stored() called, only after the writer has
+    # stored all of them. The newest-review marker only moves forward when the
+    # scan read everything back to the previous marker; otherwise the next run
+    # has to go as far back again to pick up the reviews skipped this time.
+    known_review_key = state.newest_review_key(restaurant_page_link)
+    newest_review_key = None
+    writer.start_restaurant(restaurant_page_link)
+    reviews = fetcher.restaurant_reviews(restaurant_page_link, restaurant_name, known_review_key)
     try:
-        conn = psycopg2.connect(
-            host=DB_HOST,
-            database=DB_NAME,
-            user=DB_USER,
-            password=DB_PASSWORD
-        )
-        print("Connected to the database")
-        return conn
-    except Exception as e:
-        print(f"Error connecting to the database: {e}")
-        return None
+        while True:
+            try:
+                review = next(reviews)
+            except StopIteration as finished:
+                complete = finished.value
+                break
+            if newest_review_key is None:
+                newest_review_key = review.key()  # Reviews are listed newest first
+            writer.put(review)
+    except Exception:
+        writer.end_restaurant(restaurant_name)
+        raise
+    if not complete:
+        print(f"{restaurant_name}: stopped before the end of the reviews, keeping the previous newest-review marker")
+        metrics.count("incomplete_review_scans")
+        newest_review_key = None
+
+    def stored():
+        state.mark_vendor_done(restaurant_page_link, restaurant_name, newest_review_key)
+        if on_stored:
+            on_stored()
+
+    writer.end_restaurant(restaurant_name, stored, on_failed)
 
-conn = connect_to_db()
 
-def insert_review(conn, review_text, rating, author_name, review_source, restaurant_name):
+def worker(worker_id, vendor_queue, options, limiter, state):
+    # Each worker owns its fetcher (driver / HTTP session) and a writer thread
+    # with its own DB connection. The driver is dropped after a failure and
+    # recreated lazily for the next vendor.
+    fetcher = Fetcher(options.engine, options.base_url, limiter, options.lean)
+    writer = ReviewWriter().start()
     try:
-        cur = conn.cursor()
-        # Check for duplicates
-        cur.execute(
-            "SELECT * FROM reviews WHERE review_text = %s AND author_name = %s AND restaurant_name = %s",
-            (review_text, author_name, restaurant_name)
+        while True:
+            vendor = vendor_queue.get()
+            if vendor is None:
+                vendor_queue.task_done()
+                break
+            restaurant_page_link, restaurant_name = vendor
+            try:
+                with metrics.restaurant(restaurant_page_link, restaurant_name):
+                    scrape_restaurant(fetcher, writer, state, restaurant_page_link, restaurant_name)
+            except Exception as e:
+                print(f"[worker {worker_id}] Error processing restaurant page {restaurant_page_link}: {e}")
+                metrics.count("restaurant_failures")
+                fetcher.recycle_driver()
+            finally:
+                vendor_queue.task_done()
+    finally:
+        writer.close()
+        fetcher.close()
+        print(f"[worker {worker_id}] Stopped")
+
+
+def supervise_worker(worker_id, vendor_queue, options, limiter, state):
+    # Restart the worker loop if it dies from something it did not handle itself
+    while True:
+        try:
+            worker(worker_id, vendor_queue, options, limiter, state)
+            return
+        except Exception as e:
+            logging.error(f"[worker {worker_id}] Crashed, restarting: {e}")
+            metrics.count("worker_restarts")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scrape Talabat Egypt restaurant reviews")
+    parser.add_argument(
+        "--role", choices=("standalone", "coordinator", "worker"), default="standalone",
+        help="crawl on its own, seed the shared PostgreSQL job queue, or work jobs from it"
+    )
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="number of browser workers")
+    parser.add_argument("--max-pages", type=int, default=None, help="only crawl the first N listing pages")
+    parser.add_argument(
+        "--engine", choices=("selenium", "http"), default="selenium",
+        help="fetch pages with a browser, or over plain HTTP with a browser fallback"
+    )
+    parser.add_argument(
+        "--lean", action="store_true",
+        help="eager page loads with images, fonts, CSS and trackers blocked"
+    )
+    parser.add_argument("--base-url", default=BASE_URL, help="site to crawl, e.g. a local fixture server")
+    parser.add_argument(
+        "--requests-per-second", type=float, default=config.REQUESTS_PER_SECOND,
+        help="starting request rate per host, shared by all workers (of all nodes in a distributed crawl)"
+    )
+    parser.add_argument(
+        "--max-requests-per-second", type=float, default=config.MAX_REQUESTS_PER_SECOND,
+        help="rate per host healthy responses may speed up to; in a distributed crawl this caps the "
+             "whole crawl, so raise it together with the number of nodes"
+    )
+    parser.add_argument("--state-file", default=config.CRAWL_STATE_PATH, help="SQLite file holding crawl progress")
+    parser.add_argument("--resume", action="store_true", help="continue the previous run instead of starting a new one")
+    parser.add_argument("--reset-jobs", action="store_true", help="coordinator: drop the previous crawl's jobs and host request rates first")
+    parser.add_argument("--wait", action="store_true", help="coordinator: report progress until all jobs are finished")
+    parser.add_argument(
+        "--idle-timeout", type=float, default=config.JOB_IDLE_TIMEOUT,
+        help="worker: seconds to wait for the coordinator to queue jobs before stopping"
+    )
+    parser.add_argument("--metrics-json", help="write stage timings and counters as JSON here at the end ('-' for stdout)")
+    parser.add_argument("--prometheus-file", help="keep a Prometheus text file with the run metrics up to date")
+    parser.add_argument("--profile", help="write a sampling profile of all threads here (collapsed stack format)")
+    args = parser.parse_args()
+
+    if args.engine == "http" and importlib.util.find_spec("requests") is None:
+        logging.error("--engine http needs the requests package: pip install -r requirements-optional.txt")
+        return
+
+    conn = connect_to_db()
+    if not conn:
+        return
+    ensure_review_key(conn)
+    conn.close()
+
+    run_metrics = metrics.enable() if args.metrics_json or args.prometheus_file else None
+    profiler = metrics.SamplingProfiler().start() if args.profile else None
+    stop_export = None
+    if args.prometheus_file:
+        stop_export = metrics.export_prometheus_periodically(
+            run_metrics, args.prometheus_file, config.METRICS_EXPORT_INTERVAL
         )
-        if cur.fetchone() is None:  # Insert only if no duplicate exists
-            cur.execute(
-                "INSERT INTO reviews (review_text, rating, author_name, review_source, restaurant_name) VALUES (%s, %s, %s, %s, %s)",
-                (review_text, rating, author_name, review_source, restaurant_name)
-            )
-            conn.commit()
-        cur.close()
+
+    try:
+        if args.role == "coordinator":
+            run_coordinator(args)
+        elif args.role == "worker":
+            run_queue_workers(args)
+        else:
+            run_standalone(args)
+    finally:
+        if stop_export:
+            stop_export.set()
+            run_metrics.write_prometheus(args.prometheus_file)
+        if args.metrics_json:
+            run_metrics.write_json(args.metrics_json)
+        if profiler:
+            profiler.stop(args.profile)
+
+
+def run_standalone(args):
+    # Single-process crawl: this process walks the listing and feeds its own workers
+    state = CrawlState(args.state_file)
+    if not args.resume:
+        state.start_new_run()
+
+    limiter = HostRateLimiter(rate=args.requests_per_second, max_rate=args.max_requests_per_second)
+    vendor_queue = queue.Queue(maxsize=args.workers * 4)
+    workers = [
+        threading.Thread(target=supervise_worker, args=(i, vendor_queue, args, limiter, state), name=f"worker-{i}")
+        for i in range(args.workers)
+    ]
+    for thread in workers:
+        thread.start()
+
+    queued_links = set()
+
+    def enqueue_vendor(restaurant_page_link, restaurant_name):
+        if restaurant_page_link in queued_links or state.vendor_done(restaurant_page_link):
+            return
+        queued_links.add(restaurant_page_link)
+        vendor_queue.put((restaurant_page_link, restaurant_name))
+
+    fetcher = Fetcher(args.engine, args.base_url, limiter, args.lean)
+    try:
+        if args.resume:
+            # Vendors seen by the interrupted run whose reviews were not stored yet
+            for restaurant_page_link, restaurant_name in state.pending_vendors():
+                enqueue_vendor(restaurant_page_link, restaurant_name)
+
+        total_number_of_pages = get_total_number_of_pages(fetcher)
+        if args.max_pages:
+            total_number_of_pages = min(total_number_of_pages, args.max_pages)
+        print(f"Crawling {total_number_of_pages} listing pages with {args.workers} workers")
+
+        for i in range(1, total_number_of_pages + 1):
+            if state.listing_page_done(i):
+                continue
+            try:
+                for restaurant_page_link, restaurant_name in get_vendor_cards(fetcher, i):
+                    state.add_vendor(restaurant_page_link, restaurant_name)
+                    enqueue_vendor(restaurant_page_link, restaurant_name)
+                state.mark_listing_page_done(i)
+            except Exception as e:
+                print(f"Error processing listing page {i}: {e}")
+                fetcher.recycle_driver()
+
     except Exception as e:
-        print(f"Error inserting review: {e}")
-
-try:
-    driver = webdriver.Chrome(service=service, options=chrome_options)
-    driver.get(f'https://www.talabat.com/egypt/restaurants/')
-    page_source = driver.page_source
-    soup = BeautifulSoup(page_source, "html.parser")
-    total_number_of_pages = soup.find("ul", attrs={"data-test": "pagination"}).find_all("li")[-2].find("a").text
-
-    for i in range(1, 3):
-        driver.get(f'https://www.talabat.com/egypt/restaurants/?page={i}')
-        page_source = driver.page_source
-        soup = BeautifulSoup(page_source, "html.parser")
-        total_cards_in_page = soup.find_all("div", attrs={"data-testid": "vendor"})
-        for card in total_cards_in_page:
-            restaurant_page_link = card.find("a")["href"]
-            restaurant_name = card.find("p", attrs={"data-testid": "vendor-name"}).text
+        print(f"Error crawling the restaurant listing: {e}")
+
+    finally:
+        for _ in workers:
+            vendor_queue.put(None)
+        for thread in workers:
+            thread.join()
+        fetcher.close()
+        state.close()
+
 
+def run_coordinator(args):
+    # Seeds the shared job queue with every listing page. Workers on any node
+    # turn listing pages into vendor jobs as they process them.
+    jobs = JobQueue()
+    limiter = PostgresRateLimiter(jobs, rate=args.requests_per_second, max_rate=args.max_requests_per_second)
+    fetcher = Fetcher(args.engine, args.base_url, limiter, args.lean)
+    try:
+        jobs.create_tables()
+        if args.reset_jobs:
+            jobs.reset()
+        total_number_of_pages = get_total_number_of_pages(fetcher)
+        if args.max_pages:
+            total_number_of_pages = min(total_number_of_pages, args.max_pages)
+        added = jobs.add_jobs(LISTING_PAGE, ((page, None) for page in range(1, total_number_of_pages + 1)))
+        print(f"Queued {added} of {total_number_of_pages} listing pages")
+
+        if args.wait:
+            while jobs.unfinished_jobs():
+                print(f"Jobs: {jobs.progress()}")
+                time.sleep(config.JOB_POLL_INTERVAL)
+            print(f"Crawl finished: {jobs.progress()}")
+    finally:
+        fetcher.close()
+        jobs.close()
+
+
+def queue_worker(worker_id, options, limiter, jobs, state):
+    # Claims jobs until the queue has nothing left that is pending or running.
+    # Workers may start before the coordinator has seeded the queue, so an
+    # empty queue only ends the crawl once this process has seen jobs, or
+    # after --idle-timeout without any.
+    fetcher = Fetcher(options.engine, options.base_url, limiter, options.lean)
+    writer = ReviewWriter().start()
+    started = time.monotonic()
+    try:
+        while True:
+            job = jobs.claim()
+            if job is None:
+                if not jobs.unfinished_jobs():
+                    if jobs.seen_jobs:
+                        break
+                    if time.monotonic() - started > options.idle_timeout:
+                        print(f"[worker {worker_id}] No jobs after {options.idle_timeout:.0f}s, stopping")
+                        break
+                time.sleep(config.JOB_POLL_INTERVAL)
+                continue
             try:
-                driver.get(f'https://www.talabat.com{restaurant_page_link}')
-                review_page_source = driver.page_source
-                soup = BeautifulSoup(review_page_source, "html.parser")
-                wait = WebDriverWait(driver, 10)
-
-                def click_read_more():
-                    try:
-                        read_more_button = wait.until(
-                            EC.element_to_be_clickable((By.XPATH, '//button[@data-testid="btn-load-more"]'))
+                if job.kind == LISTING_PAGE:
+                    vendors = get_vendor_cards(fetcher, int(job.target))
+                    added = jobs.add_jobs(VENDOR, vendors)
+                    print(f"[worker {worker_id}] Listing page {job.target}: queued {added} new vendors")
+                    jobs.complete(job.id)
+                else:
+                    with metrics.restaurant(job.target, job.restaurant_name):
+                        scrape_restaurant(
+                            fetcher, writer, state, job.target, job.restaurant_name,
+                            on_stored=lambda job_id=job.id: jobs.complete(job_id),
+                            on_failed=lambda job_id=job.id: jobs.fail(job_id, "reviews could not be stored"),
                         )
-                        read_more_button.click()
-                        return True
-                    except:
-                        return False
-
-                def extract_reviews():
-                    wait.until(EC.presence_of_element_located((By.XPATH, '//div[@data-testid="reviews-item-component"]')))
-                    page_source = driver.page_source
-                    soup = BeautifulSoup(page_source, "html.parser")
-                    reviews = soup.find_all("div", attrs={"data-testid": "reviews-item-component"})
-                    if not reviews:
-                        raise Exception("No reviews found on the page.")
-                    else:
-                        print("Extracted reviews")
-                        return reviews
-
-                if not conn:
-                    raise Exception("Failed to connect to the database.")
-
-                all_reviews = []
-                seen_reviews = set()  # Track seen reviews to avoid duplicates
-                previous_review_count = 0
-
-                while True:
-                    reviews = extract_reviews()
-                    if len(reviews) == previous_review_count:
-                        break  # Stop if no new reviews are loaded
-                    previous_review_count = len(reviews)
-
-                    for review in reviews:
-                        review_text = review.find("p", attrs={"data-testid": "customer-review"}).text
-                        if review_text not in seen_reviews:
-                            seen_reviews.add(review_text)
-                            all_reviews.append(review)
-
-                    if not click_read_more():
-                        break
-                    time.sleep(2)
-
-                for review in all_reviews:
-                    try:
-                        rating = review.find("div", attrs={"data-testid": "restaurant-rating-comp"}).find("div").find("div").text
-                        author_name = review.find("div", attrs={"data-testid": "customer-name"}).text
-                        text = review.find("p", attrs={"data-testid": "customer-review"}).text
-                        review_source = "Talabat"
-                        insert_review(conn, text, rating, author_name, review_source, restaurant_name)
-                    except Exception as e:
-                        logging.error(f"Error processing review: {e}")
-                        time.sleep(random.uniform(2, 5))
-
             except Exception as e:
-                print(f"Error processing restaurant page: {e}")
-                time.sleep(random.uniform(2, 5))
-
-        time.sleep(random.uniform(2, 5))
-
-except Exception as e:
-    print(f"Error initializing the driver: {e}")
-    if 'driver' in locals():
-        driver.quit()
-
-finally:
-    if conn:
-        conn.close()
-        print("Connection closed")
-    if 'driver' in locals():
-        driver.quit()
-        print("Driver closed")
\ No newline at end of file
+                print(f"[worker {worker_id}] Error processing {job.kind} {job.target}: {e}")
+                metrics.count("restaurant_failures" if job.kind == VENDOR else "listing_failures")
+                jobs.fail(job.id, e)
+                fetcher.recycle_driver()
+    finally:
+        writer.close()
+        fetcher.close()
+        print(f"[worker {worker_id}] Stopped")
+
+
+def supervise_queue_worker(worker_id, options, limiter, jobs, state):
+    # Same as supervise_worker; the pause keeps a worker from spinning while
+    # the database is unreachable
+    while True:
+        try:
+            queue_worker(worker_id, options, limiter, jobs, state)
+            return
+        except Exception as e:
+            logging.error(f"[worker {worker_id}] Crashed, restarting: {e}")
+            metrics.count("worker_restarts")
+            time.sleep(config.JOB_POLL_INTERVAL)
+
+
+def run_queue_workers(args):
+    # One process on one node of a distributed crawl; start as many as needed
+    jobs = JobQueue()
+    jobs.create_tables()
+    jobs.start_heartbeat()
+    state = PostgresCrawlState(jobs)
+    limiter = PostgresRateLimiter(jobs, rate=args.requests_per_second, max_rate=args.max_requests_per_second)
+    workers = [
+        threading.Thread(target=supervise_queue_worker, args=(i, args, limiter, jobs, state), name=f"worker-{i}")
+        for i in range(args.workers)
+    ]
+    try:
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+    finally:
+        jobs.close()
+
+
+if __name__ == "__main__":
+    main()